@@ -0,0 +1,57 @@
+import os
+
+from bench_jocker import _quiet
+from bench_jocker import MOCK_VARS_FILE
+from bench_jocker import MOCK_DOCKER_FILE
+from jocker.jocker import Jocker
+from jocker.jocker import _RecordCache
+from jocker.tests.fake_daemon import FakeDaemon
+import jocker.jocker
+import jocker.pusher
+
+
+def _jocker(tmp_dir, daemon, push):
+    # builds and pushes must not be skipped by the records of previous ones
+    jocker.jocker._build_cache = _RecordCache(
+        os.path.join(tmp_dir, 'builds.json'))
+    jocker.pusher._push_records = _RecordCache(
+        os.path.join(tmp_dir, 'pushes.json'))
+    outputfile = os.path.join(tmp_dir, 'context', 'Dockerfile')
+    os.makedirs(os.path.dirname(outputfile))
+    j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, outputfile=outputfile,
+               push=push)
+    j.client_config = daemon.client_config
+    j.build_config = dict(j.build_config, nocache=True)
+    j.generate()
+    return j
+
+
+def bench_build_image_fake_daemon(tmp_dir):
+    _quiet()
+    # ~2MB of build output
+    daemon = FakeDaemon(os.path.join(tmp_dir, 'docker.sock'),
+                        build_steps=15000).start()
+    j = _jocker(tmp_dir, daemon, 'nir0s/woo:1.0')
+    return j.build_image, daemon.stop
+
+
+def _push(tmp_dir, events_per_chunk):
+    _quiet()
+    # ~1MB of push output per target
+    daemon = FakeDaemon(os.path.join(tmp_dir, 'docker.sock'),
+                        push_layers=5, progress_events=1000,
+                        events_per_chunk=events_per_chunk).start()
+    j = _jocker(tmp_dir, daemon, 'nir0s/woo:1.0,nir0s/woo:1,nir0s/woo')
+    j.build_image()
+    j.tag_image()
+    # without an image id pushes aren't recorded, nor skipped.
+    j.image_id = None
+    return j.push_image, daemon.stop
+
+
+def bench_push_image_fake_daemon(tmp_dir):
+    return _push(tmp_dir, 1)
+
+
+def bench_push_image_concatenated_fake_daemon(tmp_dir):
+    return _push(tmp_dir, 50)
@@ -0,0 +1,185 @@
+import os
+import sys
+import json
+import logging
+import threading
+import subprocess
+try:
+    import http.client as httplib
+except ImportError:
+    import httplib
+
+from jocker import logger
+from jocker.jocker import Jocker
+from jocker.jocker import jocker_lgr
+from jocker.jocker import Renderer
+from jocker.jocker import _vars_cache
+from jocker.jocker import _import_vars
+from jocker.jocker import _iter_json_events
+from jocker.jocker import PUSH_OUTPUT_MARKERS
+
+ROOT_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+RESOURCES_DIR = os.path.join(ROOT_DIR, 'jocker', 'tests', 'resources')
+MOCK_VARS_FILE = os.path.join(RESOURCES_DIR, 'mock_varsfile.py')
+MOCK_DOCKER_FILE = os.path.join(RESOURCES_DIR, 'mock_dockerfile')
+STREAM_SIZE = 4 * 1024 * 1024
+
+HUGE_TEMPLATE = """FROM {{ image }}
+{% for key, value in env|dictsort %}ENV {{ key }} {{ value }}
+{% endfor %}RUN apt-get install -y {% for p in packages %}{{ p }} {% endfor %}
+{% for f in files %}ADD {{ f.src }} {{ f.dest }}
+{% endfor %}"""
+
+
+def _quiet():
+    # only the debug logs along the parsing paths matter, not the handlers.
+    jocker_lgr.setLevel(logging.WARNING)
+
+
+def _generate(j):
+    def generate():
+        # a cold run imports the varsfile as well as rendering it.
+        _vars_cache.clear()
+        j.generate()
+    return generate
+
+
+def bench_generate_small_vars(tmp_dir):
+    _quiet()
+    return _generate(Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, dryrun=True))
+
+
+def bench_generate_huge_vars(tmp_dir, dryrun=True):
+    _quiet()
+    varsfile = os.path.join(tmp_dir, 'huge_vars.py')
+    templatefile = os.path.join(tmp_dir, 'Dockerfile.template')
+    variables = {
+        'image': 'ubuntu:14.04',
+        'env': dict(('VAR_{0}'.format(i), 'value-{0}'.format(i))
+                    for i in range(2000)),
+        'packages': ['package-{0}'.format(i) for i in range(20000)],
+        'files': [{'src': 'src/{0}'.format(i), 'dest': '/opt/{0}'.format(i)}
+                  for i in range(2000)],
+    }
+    with open(varsfile, 'w') as f:
+        f.write('VARS = {0!r}\n'.format(variables))
+    with open(templatefile, 'w') as f:
+        f.write(HUGE_TEMPLATE)
+    return _generate(Jocker(varsfile, templatefile, dryrun=dryrun,
+                            outputfile=os.path.join(tmp_dir, 'Dockerfile')))
+
+
+def bench_generate_huge_vars_to_file(tmp_dir):
+    return bench_generate_huge_vars(tmp_dir, dryrun=False)
+
+
+def bench_render_variants(tmp_dir):
+    _quiet()
+    renderer = Renderer(MOCK_DOCKER_FILE)
+    variables = _import_vars(MOCK_VARS_FILE)
+    variants = [dict(variables, dependencies=['package-{0}'.format(i)])
+                for i in range(100)]
+
+    def render():
+        for v in variants:
+            renderer.render(v)
+    return render
+
+
+def bench_parse_push_output(tmp_dir):
+    _quiet()
+    event = json.dumps({
+        'status': 'Pushing',
+        'progressDetail': {'current': 1048576, 'total': 2097152},
+        'progress': '[=========================>      ] 1 MB/2 MB',
+        'id': '511136ea3c5a'})
+    output = event * (STREAM_SIZE // len(event))
+    j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE)
+    return lambda: j._parse_dumb_push_output(output)
+
+
+def bench_parse_build_output(tmp_dir):
+    _quiet()
+    # the daemon streams a json object per line and docker-py yields them
+    # line by line.
+    lines = [json.dumps({'stream': 'Step {0} : RUN make -j4 target-{0} '
+                                   '&& make install\n'.format(i)}) + '\r\n'
+             for i in range(STREAM_SIZE // 80)]
+    lines.append(json.dumps({'stream': 'Successfully built 0123456789ab\n'}))
+    j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE)
+    return lambda: j._read_build_output(iter(lines))
+
+
+def bench_read_push_stream(tmp_dir):
+    _quiet()
+    event = json.dumps({
+        'status': 'Pushing',
+        'progressDetail': {'current': 1048576, 'total': 2097152},
+        'progress': '[=========================>      ] 1 MB/2 MB',
+        'id': '511136ea3c5a'}) + '\r\n'
+    chunks = [event] * (STREAM_SIZE // len(event))
+    chunks.append(json.dumps({'status': 'latest: digest: sha256:0123 '
+                                        'size: 1024'}))
+
+    def read():
+        for _ in _iter_json_events(chunks, PUSH_OUTPUT_MARKERS):
+            pass
+    return read
+
+
+def bench_log_dockerfile_not_verbose(tmp_dir):
+    _quiet()
+    text = 'RUN apt-get install -y {0}\n'.format(
+        ' '.join('package-{0}'.format(i) for i in range(20000)))
+
+    def log():
+        for _ in range(100):
+            jocker_lgr.debug('Output content: \n{0}', text)
+    return log
+
+
+def bench_logger_init(tmp_dir):
+    return logger.init
+
+
+def bench_cli_dryrun_cold_start(tmp_dir):
+    command = [sys.executable, '-m', 'jocker.cli', '-f', MOCK_VARS_FILE,
+               '-t', MOCK_DOCKER_FILE, '--dryrun']
+    devnull = open(os.devnull, 'w')
+
+    def run():
+        subprocess.check_call(command, stdout=devnull, cwd=ROOT_DIR)
+    return run
+
+
+def bench_serve_dryrun(tmp_dir):
+    from jocker.server import create_server
+    _quiet()
+    server = create_server(port=0, workers=1, token='bench')
+    thread = threading.Thread(target=server.serve_forever, args=(0.05,))
+    thread.daemon = True
+    thread.start()
+    body = json.dumps({'templatefile': MOCK_DOCKER_FILE,
+                       'varsfile': MOCK_VARS_FILE, 'dryrun': True})
+
+    def request():
+        # the equivalent of cli_dryrun_cold_start, served warm.
+        connection = httplib.HTTPConnection(*server.server_address)
+        connection.request('POST', '/render', body, {
+            'Content-Type': 'application/json',
+            'Authorization': 'Bearer bench'})
+        connection.getresponse().read()
+        connection.close()
+
+    def cleanup():
+        server.shutdown()
+        server.server_close()
+    return request, cleanup
+
+
+def bench_import_cli(tmp_dir):
+    command = [sys.executable, '-c', 'import jocker.cli']
+
+    def run():
+        subprocess.check_call(command, cwd=ROOT_DIR)
+    return run
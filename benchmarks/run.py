@@ -0,0 +1,149 @@
+# flake8: NOQA
+
+"""Runs jocker's benchmarks and compares them with a baseline
+
+Every `bench_*` function in the `bench_*.py` modules in this directory is
+a benchmark. It's called with a temporary directory to set up in and
+returns the callable to time (or a tuple of it and a callable to clean up
+with once timed). Each benchmark's callable is called until it
+ran for at least --min-time seconds, --repeat times over, and the fastest
+time per call is kept.
+
+Benchmarks which are slower than their baseline by more than --threshold
+(a ratio) are reported as regressions and fail the run. Baselines are
+only meaningful on the machine they were saved on: run with --save to
+update them after changing the code or the machine.
+
+Usage:
+    run.py [--baseline=<path> --threshold=<ratio> --repeat=<n> --min-time=<seconds> --save] [<pattern>...]
+
+Options:
+    -h --help                   Show this screen.
+    --baseline=<path>           Path to the baseline json file [default: benchmarks/baseline.json]
+    --threshold=<ratio>         Fail if a benchmark is slower than its baseline by more than this ratio [default: 0.25]
+    --repeat=<n>                Number of times to time each benchmark [default: 5]
+    --min-time=<seconds>        Minimum time to run each benchmark for on each repeat [default: 0.1]
+    --save                      Save the results as the new baseline
+    <pattern>                   Only run benchmarks whose names contain any of the patterns
+"""
+
+import os
+import sys
+import glob
+import json
+import time
+import shutil
+import platform
+import tempfile
+
+BENCHMARKS_DIR = os.path.dirname(os.path.abspath(__file__))
+sys.path.insert(0, os.path.dirname(BENCHMARKS_DIR))
+sys.path.insert(0, BENCHMARKS_DIR)
+
+from docopt import docopt  # NOQA
+
+
+def discover(patterns=None):
+    """returns a sorted list of (name, function) of all benchmarks"""
+    benchmarks = []
+    for path in glob.glob(os.path.join(BENCHMARKS_DIR, 'bench_*.py')):
+        module = __import__(os.path.splitext(os.path.basename(path))[0])
+        for name in dir(module):
+            if not name.startswith('bench_'):
+                continue
+            name = name[len('bench_'):]
+            if patterns and not any(p in name for p in patterns):
+                continue
+            benchmarks.append((name, getattr(module, 'bench_' + name)))
+    return sorted(benchmarks)
+
+
+def _time(func, number):
+    start = time.time()
+    for _ in range(number):
+        func()
+    return time.time() - start
+
+
+def measure(func, repeat, min_time):
+    """returns the fastest time per call to `func` in seconds"""
+    func()
+    number = 1
+    elapsed = _time(func, number)
+    while elapsed < min_time:
+        number *= 2
+        elapsed = _time(func, number)
+    best = elapsed / number
+    for _ in range(repeat - 1):
+        best = min(best, _time(func, number) / number)
+    return best
+
+
+def _format_time(seconds):
+    for unit, scale in (('s', 1), ('ms', 1e-3), ('us', 1e-6)):
+        if seconds >= scale:
+            return '{0:.2f}{1}'.format(seconds / scale, unit)
+    return '{0:.0f}ns'.format(seconds / 1e-9)
+
+
+def load_baseline(path):
+    if not os.path.isfile(path):
+        return {}
+    with open(path) as f:
+        return json.load(f).get('benchmarks', {})
+
+
+def save_baseline(path, results):
+    with open(path, 'w') as f:
+        json.dump({
+            'python': platform.python_version(),
+            'platform': platform.platform(),
+            'benchmarks': results,
+        }, f, indent=2, sort_keys=True, separators=(',', ': '))
+        f.write('\n')
+
+
+def main(argv=None):
+    o = docopt(__doc__, argv)
+    threshold = float(o['--threshold'])
+    baseline = load_baseline(o['--baseline'])
+    results = {}
+    regressions = []
+    for name, setup in discover(o['<pattern>']):
+        tmp_dir = tempfile.mkdtemp()
+        cleanup = None
+        try:
+            func = setup(tmp_dir)
+            if isinstance(func, tuple):
+                func, cleanup = func
+            results[name] = measure(
+                func, int(o['--repeat']), float(o['--min-time']))
+        finally:
+            if cleanup:
+                cleanup()
+            shutil.rmtree(tmp_dir)
+        line = '{0:<40} {1:>10}'.format(name, _format_time(results[name]))
+        if name in baseline:
+            change = results[name] / baseline[name] - 1
+            line += '  {0:+6.1%} vs {1}'.format(
+                change, _format_time(baseline[name]))
+            if change > threshold:
+                line += '  REGRESSION'
+                regressions.append(name)
+        print(line)
+        sys.stdout.flush()
+
+    if o['--save']:
+        baseline.update(results)
+        save_baseline(o['--baseline'], baseline)
+        print('baseline saved to {0}'.format(o['--baseline']))
+        return 0
+    if regressions:
+        print('{0} benchmarks regressed by more than {1:.0%}: {2}'.format(
+            len(regressions), threshold, ', '.join(regressions)))
+        return 1
+    return 0
+
+
+if __name__ == '__main__':
+    sys.exit(main())
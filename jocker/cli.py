@@ -3,8 +3,11 @@
 """Script to run Jocker via command line
 
 Usage:
-    jocker [--varsfile=<path> --templatefile=<path> --outputfile=<path> --dockerconfig=<path> --dryrun -v]
-           [--build=<string>|--push=<string>]
+    jocker [--varsfile=<path> --templatefile=<path> --outputfile=<path> --dockerconfig=<path> --dryrun --skip-unchanged --watch --timings --timings-out=<path> --profile-out=<path> --output=<format> -v]
+           [--build=<string>|--push=<string> --skip-pushed]
+    jocker --matrix=<glob> [--templatefile=<path> --outputfile=<pattern> --dockerconfig=<path> --workers=<n> --skip-unchanged --timings --timings-out=<path> --profile-out=<path> --output=<format> -v]
+           [--build=<pattern>]
+    jocker serve [--socket=<path>|--port=<port>] [--host=<host> --token=<token> --workers=<n> --output=<format> -v]
     jocker --version
 
 Options:
@@ -14,19 +17,36 @@ Options:
     -o --outputfile=<path>      Path to output Dockerfile (if omitted, will assume "Dockerfile")
     -c --dockerconfig=<path>    Path to yaml file containing docker-py configuration
     -d --dryrun                 Whether to actually generate.. or just dryrun
+    -s --skip-unchanged         Don't rewrite an unchanged Dockerfile (leaving its mtime untouched)
+    -w --watch                  Regenerate (and build, if --build is supplied) whenever the template, its includes or the varsfile change
     -b --build=<string>         Image Repository and Tag to build
-    -p --push=<string>          Image Repository and Tag to push to (will target build)
+    -p --push=<string>          Comma separated Image Repositories and Tags to push to (will target build, which is built once and tagged as each)
+    --skip-pushed               Don't push the image to targets it was already pushed to (as recorded locally, the registry isn't consulted)
+    -m --matrix=<glob>          Comma separated varsfiles or globs to render a Dockerfile for each of (--outputfile must contain "{name}")
+    --workers=<n>               Number of worker processes to render a matrix with and of images to build (or of requests to serve) concurrently (defaults to the number of CPUs)
+    --socket=<path>             Serve on a unix socket at <path> (defaults to ~/.jocker/jocker.sock, unless --port or --host is supplied)
+    --host=<host>               Address to serve on (defaults to 127.0.0.1)
+    --port=<port>               Port to serve on (defaults to 8642 if --host is supplied)
+    --token=<token>             Token requests must supply as "Authorization: Bearer <token>" (defaults to $JOCKER_SERVE_TOKEN, required to serve on a port)
+    --timings                   Print the time spent in each phase (config, vars, compile, render, context, build, tag, push)
+    --timings-out=<path>        Write the time spent in each phase to a json file (implies --timings)
+    --profile-out=<path>        Profile the run and write pstats (or collapsed stacks, if <path> ends with .collapsed or .folded) to <path>
+    --output=<format>           Output format: "text" logs to stdout, "json" writes an event per line to stdout and logs to stderr [default: text]
     -v --verbose                a LOT of output (Note: should be used carefully..)
     --version                   Display current version of jocker and exit
 """
 
 from __future__ import absolute_import
 from docopt import docopt
-from jocker.logger import init
+from jocker.jocker import jocker_lgr
 from jocker.jocker import _set_global_verbosity_level
 from jocker.jocker import execute
-
-jocker_lgr = init()
+from jocker.jocker import execute_matrix
+from jocker.timings import timings
+from jocker.events import events
+from jocker import logger
+import time
+import sys
 
 
 def ver_check():
@@ -42,6 +62,21 @@ def ver_check():
 
 
 def jocker_run(o):
+    if o.get('serve'):
+        from jocker.server import serve
+        return serve(o.get('--socket'), o.get('--host'), o.get('--port'),
+                     o.get('--workers'), o.get('--token'))
+    if o.get('--matrix'):
+        return execute_matrix(
+            o.get('--matrix'),
+            o.get('--templatefile'),
+            o.get('--outputfile'),
+            o.get('--workers'),
+            o.get('--verbose'),
+            o.get('--skip-unchanged'),
+            o.get('--build'),
+            o.get('--dockerconfig')
+            )
     execute(
         o.get('--varsfile'),
         o.get('--templatefile'),
@@ -50,17 +85,52 @@ def jocker_run(o):
         o.get('--dryrun'),
         o.get('--build'),
         o.get('--push'),
-        o.get('--verbose')
+        o.get('--verbose'),
+        o.get('--skip-unchanged'),
+        o.get('--watch'),
+        o.get('--skip-pushed')
         )
 
 
+def profile_run(o):
+    if not o.get('--profile-out'):
+        return jocker_run(o)
+    from jocker.profiler import profile
+    return profile(jocker_run, o.get('--profile-out'), o)
+
+
+def report_timings(timings_out=None):
+    for row in timings.format_table():
+        jocker_lgr.info(row)
+    if timings_out:
+        timings.dump(timings_out)
+        jocker_lgr.info('timings written to {0}', timings_out)
+
+
 def jocker(test_options=None):
     """Main entry point for script."""
-    version = ver_check()
-    options = test_options or docopt(__doc__, version=version)
+    options = test_options or docopt(__doc__)
+    if options.get('--version'):
+        # pkg_resources takes long to import, so the version is only looked
+        # up when it's asked for.
+        print(ver_check())
+        return
     _set_global_verbosity_level(options.get('--verbose'))
     jocker_lgr.debug(options)
-    jocker_run(options)
+    if options.get('--output') not in (None, 'text', 'json'):
+        sys.exit('unknown output format: {0}'.format(options['--output']))
+    if options.get('--output') == 'json':
+        logger.set_console_stream(sys.stderr)
+        events.enable(sys.stdout)
+    if not (options.get('--timings') or options.get('--timings-out')):
+        return profile_run(options)
+    timings.enable()
+    start = time.time()
+    try:
+        return profile_run(options)
+    finally:
+        timings.record('total', time.time() - start)
+        report_timings(options.get('--timings-out'))
 
 
 def main():
@@ -0,0 +1,317 @@
+from __future__ import absolute_import
+import os
+import re
+import glob
+import json
+import hashlib
+import tempfile
+from jocker.jocker import jocker_lgr
+from jocker.jocker import _write_file
+
+DEFAULT_CONTEXT_CACHE_DIR = os.path.expanduser('~/.jocker/contexts')
+DEFAULT_CONTEXT_CACHE_MAX_SIZE = 1024 * 1024 * 1024
+DEFAULT_HASH_WORKERS = 4
+DOCKERIGNORE = '.dockerignore'
+
+
+def _read_dockerignore(path):
+    """returns the list of patterns in the .dockerignore file in `path`
+
+    :param string path: path to the build context
+    """
+    dockerignore = os.path.join(path, DOCKERIGNORE)
+    if not os.path.isfile(dockerignore):
+        return []
+    with open(dockerignore, 'r') as f:
+        patterns = [line.strip() for line in f.read().splitlines()]
+    return [p for p in patterns if p and not p.startswith('#')]
+
+
+# compiled .dockerignore patterns by pattern. see `_compile_pattern`.
+_patterns = {}
+
+
+def _compile_pattern(pattern):
+    """returns a regex matching paths the way docker matches a
+    .dockerignore pattern
+
+    Unlike `fnmatch`, `*` and `?` never match a `/`, so `*.log` only
+    matches log files at the root of the context. `**` matches any number
+    of directories (e.g. `**/*.log` matches log files anywhere).
+
+    :param string pattern: .dockerignore pattern (sans `!`)
+    """
+    regex = _patterns.get(pattern)
+    if regex is not None:
+        return regex
+    cleaned = os.path.normpath(pattern.strip('/'))
+    parts = []
+    i = 0
+    while i < len(cleaned):
+        char = cleaned[i]
+        if cleaned.startswith('**/', i):
+            parts.append('(?:.*/)?')
+            i += 2
+        elif cleaned.startswith('**', i):
+            parts.append('.*')
+            i += 1
+        elif char == '*':
+            parts.append('[^/]*')
+        elif char == '?':
+            parts.append('[^/]')
+        elif char == '[' and ']' in cleaned[i + 1:]:
+            end = cleaned.index(']', i + 1)
+            chars = cleaned[i + 1:end]
+            if chars.startswith('^') or chars.startswith('!'):
+                chars = '^' + chars[1:]
+            parts.append('[{0}]'.format(chars.replace('\\', '\\\\')))
+            i = end
+        elif char == '\\' and i + 1 < len(cleaned):
+            i += 1
+            parts.append(re.escape(cleaned[i]))
+        else:
+            parts.append(re.escape(char))
+        i += 1
+    regex = _patterns[pattern] = re.compile('^{0}$'.format(''.join(parts)))
+    return regex
+
+
+def _is_excluded(relpath, patterns):
+    """returns whether a path is excluded by any of the patterns
+
+    A pattern matches a path if it matches the path itself or any of its
+    parent directories (see `_compile_pattern`). A pattern prefixed with
+    `!` re-includes what the patterns preceding it excluded.
+
+    :param string relpath: path relative to the build context
+    :param list patterns: .dockerignore patterns
+    """
+    parents = []
+    head = relpath
+    while head:
+        parents.append(head)
+        head = os.path.dirname(head)
+    excluded = False
+    for pattern in patterns:
+        negate = pattern.startswith('!')
+        if negate:
+            pattern = pattern[1:]
+        regex = _compile_pattern(pattern)
+        if any(regex.match(p) for p in parents):
+            excluded = not negate
+    return excluded
+
+
+def _hash(path):
+    """returns the sha1 hexdigest of a file or None if it doesn't exist
+
+    :param string path: path to file
+    """
+    digest = hashlib.sha1()
+    try:
+        with open(path, 'rb') as f:
+            for block in iter(lambda: f.read(65536), b''):
+                digest.update(block)
+    except IOError:
+        return None
+    return digest.hexdigest()
+
+
+def _walk(path, patterns):
+    """yields the relative path and lstat of every path in the context
+    which isn't excluded.
+    """
+    negations = any(p.startswith('!') for p in patterns)
+    for root, dirs, files in os.walk(path):
+        reldir = os.path.relpath(root, path)
+        reldir = '' if reldir == os.curdir else reldir
+        for name in sorted(dirs):
+            relpath = os.path.join(reldir, name)
+            excluded = _is_excluded(relpath, patterns)
+            # an excluded directory can only be skipped entirely if nothing
+            # in it can be re-included.
+            if excluded and not negations:
+                dirs.remove(name)
+            if not excluded:
+                yield relpath, os.lstat(os.path.join(root, name))
+        for name in sorted(files):
+            relpath = os.path.join(reldir, name)
+            if not _is_excluded(relpath, patterns):
+                yield relpath, os.lstat(os.path.join(root, name))
+
+
+def _load_manifest(manifest_file):
+    try:
+        with open(manifest_file, 'r') as f:
+            return json.load(f)
+    except (IOError, ValueError):
+        return None
+
+
+def get_manifest(path, previous=None, workers=DEFAULT_HASH_WORKERS):
+    """returns a manifest of the files in a build context
+
+    The manifest is a sorted list of [path, size, mtime, sha1] entries for
+    every path in the context which isn't excluded by its .dockerignore
+    file. Files are hashed in parallel. Hashes found in a `previous`
+    manifest are reused for files whose size and mtime didn't change.
+
+    :param string path: path to the build context
+    :param list previous: a previously generated manifest of `path`
+    :param int workers: number of threads to hash files with
+    :rtype: `list`
+    """
+    known = {}
+    for relpath, size, mtime, digest in previous or []:
+        known[relpath] = (size, mtime, digest)
+    manifest = []
+    to_hash = []
+    for relpath, stat in _walk(path, _read_dockerignore(path)):
+        entry = [relpath, stat.st_size, stat.st_mtime, '']
+        full_path = os.path.join(path, relpath)
+        if os.path.isdir(full_path) and not os.path.islink(full_path):
+            # a directory's size and mtime change whenever anything in it
+            # changes, including files which are excluded.
+            entry[1:3] = [0, 0]
+        elif os.path.islink(full_path):
+            entry[3] = hashlib.sha1(os.readlink(full_path)).hexdigest()
+        elif os.path.isfile(full_path):
+            cached = known.get(relpath)
+            if cached and cached[:2] == (entry[1], entry[2]):
+                entry[3] = cached[2]
+            else:
+                to_hash.append(entry)
+        manifest.append(entry)
+
+    if to_hash:
+        jocker_lgr.debug('hashing {0} files in {1}', len(to_hash), path)
+        paths = [os.path.join(path, e[0]) for e in to_hash]
+        if workers > 1 and len(to_hash) > 1:
+            from multiprocessing.pool import ThreadPool
+            pool = ThreadPool(min(workers, len(to_hash)))
+            try:
+                digests = pool.map(_hash, paths)
+            finally:
+                pool.close()
+                pool.join()
+        else:
+            digests = [_hash(p) for p in paths]
+        for entry, digest in zip(to_hash, digests):
+            entry[3] = digest
+    return sorted(manifest)
+
+
+def _make_tar(path, manifest, tar_file, encoding=None, sources=None):
+    import tarfile
+    sources = sources or {}
+    fd, tmp_path = tempfile.mkstemp(dir=os.path.dirname(tar_file))
+    os.close(fd)
+    try:
+        tar = tarfile.open(tmp_path, 'w:gz' if encoding == 'gzip' else 'w')
+        try:
+            for entry in manifest:
+                tar.add(sources.get(entry[0], os.path.join(path, entry[0])),
+                        arcname=entry[0], recursive=False)
+        finally:
+            tar.close()
+        if os.name == 'nt' and os.path.isfile(tar_file):
+            os.remove(tar_file)
+        os.rename(tmp_path, tar_file)
+    except (IOError, OSError):
+        if os.path.exists(tmp_path):
+            os.remove(tmp_path)
+        raise
+
+
+def _evict(cache_dir, max_size, keep):
+    """removes the least recently used tarballs (and their manifests)
+    from `cache_dir` until it's no larger than `max_size`, other than
+    `keep`.
+    """
+    entries = []
+    for tar_file in glob.glob(os.path.join(cache_dir, '*.tar')):
+        manifest_file = os.path.splitext(tar_file)[0] + '.json'
+        try:
+            size = os.path.getsize(tar_file)
+            # a manifest is touched whenever its tarball is (re)used.
+            used = os.path.getmtime(manifest_file)
+        except OSError:
+            used = 0
+        entries.append((used, size, tar_file, manifest_file))
+    size = sum(entry[1] for entry in entries)
+    for _, entry_size, tar_file, manifest_file in sorted(entries):
+        if size <= max_size:
+            break
+        if tar_file == keep:
+            continue
+        jocker_lgr.debug('evicting build context: {0}', tar_file)
+        for entry_path in (manifest_file, tar_file):
+            try:
+                os.remove(entry_path)
+            except OSError:
+                pass
+        size -= entry_size
+
+
+def build_context(path, encoding=None, cache_dir=None,
+                  workers=DEFAULT_HASH_WORKERS,
+                  max_size=DEFAULT_CONTEXT_CACHE_MAX_SIZE, dockerfile=None):
+    """creates a tarball of a build context honouring its .dockerignore
+
+    The tarball and the manifest it was created from are kept in
+    `cache_dir`. If the manifest of the context didn't change since,
+    the tarball is reused rather than recreated. Once the tarballs in
+    `cache_dir` grow beyond `max_size`, the least recently used ones are
+    evicted.
+
+    As the daemon always builds the context's `Dockerfile`, a `dockerfile`
+    named otherwise (e.g. `Dockerfile.{name}`) is added to the tarball
+    as `Dockerfile` in its stead.
+
+    :param string path: path to the build context
+    :param string encoding: `gzip` to compress the tarball.
+    :param string cache_dir: directory to keep tarballs in (defaults to
+     `DEFAULT_CONTEXT_CACHE_DIR`)
+    :param int workers: number of threads to hash files with
+    :param int max_size: size in bytes to bound the tarballs by.
+    :param string dockerfile: path to the Dockerfile to build.
+    :rtype: `tuple` of the tarball's path and the manifest's sha1
+    """
+    path = os.path.abspath(path)
+    cache_dir = cache_dir or DEFAULT_CONTEXT_CACHE_DIR
+    if not os.path.isdir(cache_dir):
+        os.makedirs(cache_dir)
+    sources = {}
+    key = '{0}|{1}'.format(path, encoding)
+    if dockerfile and os.path.abspath(dockerfile) != \
+            os.path.join(path, 'Dockerfile'):
+        sources['Dockerfile'] = os.path.abspath(dockerfile)
+        key = '{0}|{1}'.format(key, sources['Dockerfile'])
+    key = hashlib.sha1(key).hexdigest()
+    tar_file = os.path.join(cache_dir, key + '.tar')
+    manifest_file = os.path.join(cache_dir, key + '.json')
+
+    previous = _load_manifest(manifest_file)
+    manifest = get_manifest(path, previous, workers)
+    if sources:
+        stat = os.stat(sources['Dockerfile'])
+        manifest = sorted([e for e in manifest if e[0] != 'Dockerfile'] + [[
+            'Dockerfile', stat.st_size, stat.st_mtime,
+            _hash(sources['Dockerfile'])]])
+    manifest_digest = hashlib.sha1(json.dumps(manifest)).hexdigest()
+    if manifest == previous and os.path.isfile(tar_file):
+        jocker_lgr.debug('build context unchanged, reusing {0}', tar_file)
+        try:
+            os.utime(manifest_file, None)
+        except OSError:
+            pass
+        return tar_file, manifest_digest
+
+    jocker_lgr.debug('creating build context {0} from {1} ({2} entries)',
+                     tar_file, path, len(manifest))
+    _make_tar(path, manifest, tar_file, encoding, sources)
+    # written to a temp file and renamed, as concurrent builds of the same
+    # context share the manifest.
+    _write_file(manifest_file, json.dumps(manifest))
+    _evict(cache_dir, max_size, tar_file)
+    return tar_file, manifest_digest
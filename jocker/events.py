@@ -0,0 +1,58 @@
+import sys
+import json
+import time
+import threading
+
+
+class Events():
+    """emits the lifecycle events of a jocker run as json lines
+
+    Each event is written as a single json object (on a line of its own) as
+    soon as it happens, e.g.:
+
+        {"event": "build_step", "build": "nir0s/woo:1.0", "step": 1, ...}
+
+    Every event has an `event` type and a `time` (seconds since the epoch).
+    The types emitted are:
+
+    - `render`: a Dockerfile was rendered (`outputfile`, `changed`).
+    - `build_output`: a line of a build's output (`build`, `line`).
+    - `build_step`: a build started a step (`build`, `step`, `instruction`).
+    - `image`: an image was built or reused (`build`, `id`, `size`,
+      `layers`, `digests`, `cached`).
+    - `push_progress`: a push's progress (`target`, `layer`, `status`,
+      `current`, `total`).
+    - `push`: a push is done (`target`, `status`, `digest`, `duration`).
+    - `error`: a build or push failed (`phase`, `message` and `build` or
+      `target`).
+
+    While disabled (the default), `emit` returns right away.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.stream = None
+        self._lock = threading.Lock()
+
+    def enable(self, stream=None):
+        """emits events to `stream` (defaults to stdout)"""
+        self.stream = stream or sys.stdout
+        self.enabled = True
+
+    def disable(self):
+        self.enabled = False
+
+    def emit(self, event, **fields):
+        if not self.enabled:
+            return
+        fields['event'] = event
+        fields['time'] = time.time()
+        line = json.dumps(fields, sort_keys=True) + '\n'
+        # events are emitted from build and push threads, each is written
+        # in a single write so that lines never interleave.
+        with self._lock:
+            self.stream.write(line)
+            self.stream.flush()
+
+
+events = Events()
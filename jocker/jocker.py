@@ -1,19 +1,54 @@
 import logger
+from timings import timings
+from events import events
 import logging
 import os
 import sys
-from jingen.jingen import Jingen
-import docker
+import jinja2
 import json
 import re
-import yaml
-import socket
+import glob
+import hashlib
+import itertools
+import imp
+import tempfile
+import shutil
+import threading
+import contextlib
+import time
+# docker, yaml and multiprocessing are only imported once they're needed
+# (i.e. to build or push, to import a docker config or a yaml varsfile and
+# to render a matrix) so that generating a Dockerfile starts up fast.
+try:
+    import simplejson as fast_json
+except ImportError:
+    fast_json = json
 
 
 DEFAULT_CONFIG_FILE = os.path.expanduser('~/.jocker/config.yml')
 DEFAULT_TEMPLATEFILE = 'Dockerfile.template'
 DEFAULT_VARSFILE = 'varsfile.py'
 DEFAULT_OUTPUTFILE = 'Dockerfile'
+DEFAULT_MATRIX_OUTPUTFILE = 'Dockerfile.{name}'
+DEFAULT_CACHE_DIR = os.path.expanduser('~/.jocker/cache')
+DEFAULT_CACHE_MAX_SIZE = 50 * 1024 * 1024
+DEFAULT_BUILD_CACHE_FILE = os.path.expanduser('~/.jocker/builds.json')
+DEFAULT_PUSH_RECORDS_FILE = os.path.expanduser('~/.jocker/pushes.json')
+DEFAULT_RECORD_CACHE_MAX_ENTRIES = 1000
+# rendered text is written in blocks of this many chunks (each typically
+# a few characters long, as rendered by a single template expression).
+DEFAULT_RENDER_BLOCK_SIZE = 4096
+# build options which have no effect on the image a build produces.
+BUILD_CACHE_IGNORED_OPTIONS = (
+    'quiet', 'stream', 'timeout', 'nocache', 'fileobj', 'custom_context')
+
+BUILD_SUCCESS_RE = re.compile(r'^Successfully built ([0-9a-f]+)')
+BUILD_STEP_RE = re.compile(r'^Step (\d+)(?:/\d+)? : (.*)')
+# substrings of the build and push events acted upon at any log level.
+BUILD_OUTPUT_MARKERS = ('"error"', 'Successfully built')
+PUSH_OUTPUT_MARKERS = ('"error"', 'digest: ')
+_JSON_SPECIAL_CHARS = re.compile(r'[{}"]')
+_JSON_STRING_SPECIAL_CHARS = re.compile(r'["\\]')
 
 DEFAULT_DOCKER_CONFIG = {
     'client': {
@@ -33,8 +68,21 @@ DEFAULT_DOCKER_CONFIG = {
     }
 }
 
-jocker_lgr = logger.init()
+jocker_lgr = logger.BraceLogger(logger.init(queued=True))
 verbose_output = False
+# jinja2 environments by template and cache dirs. an environment keeps compiled
+# templates in memory so that rendering a template many times in a single
+# process (e.g. in a matrix) only loads it once.
+_environments = {}
+# parsed vars by varsfile path. see `_import_vars`.
+_vars_cache = {}
+# parsed docker configs by config file path. see `_import_config`.
+_config_cache = {}
+# the process' umask. reading it means setting it, which would race with
+# files created by other threads (e.g. concurrent builds), so it's only read
+# once, on import.
+_UMASK = os.umask(0)
+os.umask(_UMASK)
 
 
 def _set_global_verbosity_level(is_verbose_output=False):
@@ -55,25 +103,688 @@ def _set_global_verbosity_level(is_verbose_output=False):
 def _import_config(config_file):
     """returns a configuration object
 
+    Parsed configs are kept in memory for as long as the config file's
+    mtime and size remain the same (see `_import_vars`).
+
     :param string config_file: path to config file
     """
+    import yaml
     # get config file path
-    jocker_lgr.debug('config file is: {0}'.format(config_file))
+    jocker_lgr.debug('config file is: {0}', config_file)
     # append to path for importing
     try:
+        path = os.path.abspath(config_file)
+        stat = os.stat(path)
+        cached = _config_cache.get(path)
+        if cached and cached[0] == (stat.st_mtime, stat.st_size):
+            return cached[1]
         jocker_lgr.debug('importing config...')
         with open(config_file, 'r') as c:
-            return yaml.safe_load(c.read())
-    except IOError as ex:
+            config = yaml.safe_load(c.read())
+        _config_cache[path] = ((stat.st_mtime, stat.st_size), config)
+        return config
+    except (IOError, OSError) as ex:
         jocker_lgr.error(str(ex))
         raise RuntimeError('cannot access config file')
     except yaml.parser.ParserError as ex:
-        jocker_lgr.error('invalid yaml file: {0}'.format(ex))
+        jocker_lgr.error('invalid yaml file: {0}', ex)
         raise RuntimeError('invalid yaml file')
 
 
+class _BytecodeCache(jinja2.FileSystemBytecodeCache):
+    """a size bounded, on-disk cache of compiled templates
+
+    jinja2 already invalidates a cached template when its source changes.
+    The cache key also takes the version of jinja2 into account so that
+    upgrading it never loads bytecode compiled by another version.
+    Once the cache grows beyond `max_size`, the least recently used
+    templates are evicted.
+    """
+
+    def __init__(self, directory, max_size=DEFAULT_CACHE_MAX_SIZE):
+        if not os.path.isdir(directory):
+            os.makedirs(directory)
+        jinja2.FileSystemBytecodeCache.__init__(
+            self, directory, '__jocker_%s.cache')
+        self.max_size = max_size
+
+    def get_cache_key(self, name, filename=None):
+        key = jinja2.FileSystemBytecodeCache.get_cache_key(
+            self, name, filename)
+        return hashlib.sha1('{0}|{1}'.format(
+            key, jinja2.__version__)).hexdigest()
+
+    def load_bytecode(self, bucket):
+        path = self._get_cache_filename(bucket)
+        try:
+            with open(path, 'rb') as f:
+                bucket.load_bytecode(f)
+            # mark the template as recently used for eviction's sake.
+            os.utime(path, None)
+        except (IOError, OSError):
+            bucket.reset()
+        except (EOFError, ValueError, TypeError):
+            # a corrupt cache file will just be recompiled and replaced.
+            bucket.reset()
+
+    def dump_bytecode(self, bucket):
+        # written to a temp file and renamed so that concurrent renders
+        # never load a partially written template.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory)
+        try:
+            with os.fdopen(fd, 'wb') as f:
+                bucket.write_bytecode(f)
+            os.rename(tmp_path, self._get_cache_filename(bucket))
+        except (IOError, OSError) as ex:
+            jocker_lgr.debug('failed to cache template ({0})', ex)
+            if os.path.exists(tmp_path):
+                os.remove(tmp_path)
+            return
+        self._evict()
+
+    def _evict(self):
+        entries = []
+        for path in glob.glob(os.path.join(
+                self.directory, self.pattern % '*')):
+            try:
+                stat = os.stat(path)
+            except OSError:
+                continue
+            entries.append((stat.st_mtime, stat.st_size, path))
+        size = sum(entry[1] for entry in entries)
+        for _, entry_size, path in sorted(entries):
+            if size <= self.max_size:
+                break
+            jocker_lgr.debug('evicting cached template: {0}', path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+            size -= entry_size
+
+
+def _get_environment(template_dir, cache_dir=DEFAULT_CACHE_DIR):
+    """returns a jinja2 environment for the templates in `template_dir`
+
+    environments are kept for the lifetime of the process and, unless
+    `cache_dir` is None, compiled templates are cached on disk so that
+    an unchanged template is never parsed or compiled twice.
+
+    :param string template_dir: directory to load templates from.
+    :param string cache_dir: directory to cache compiled templates in.
+    :rtype: `jinja2.Environment`
+    """
+    template_dir = os.path.abspath(template_dir or os.curdir)
+    env = _environments.get((template_dir, cache_dir))
+    if env is None:
+        bytecode_cache = None
+        if cache_dir:
+            try:
+                bytecode_cache = _BytecodeCache(cache_dir)
+            except (IOError, OSError) as ex:
+                jocker_lgr.debug('template cache disabled ({0})', ex)
+        env = jinja2.Environment(
+            loader=jinja2.FileSystemLoader(template_dir),
+            bytecode_cache=bytecode_cache)
+        _environments[(template_dir, cache_dir)] = env
+    return env
+
+
+def _load_python_vars(path):
+    # the varsfile is loaded under a name derived from its absolute path
+    # so that different varsfiles sharing a basename (as is common when
+    # rendering a matrix) never shadow each other in `sys.modules`.
+    name = 'jocker_vars_{0}'.format(hashlib.sha1(path).hexdigest())
+    try:
+        return imp.load_source(name, path).VARS
+    except AttributeError:
+        raise JockerError('VARS missing from vars file: {0}'.format(path))
+
+
+def _load_yaml_vars(path):
+    import yaml
+    # libyaml's loader is only available if pyyaml was built with it.
+    loader = getattr(yaml, 'CSafeLoader', yaml.SafeLoader)
+    with open(path, 'r') as f:
+        try:
+            return yaml.load(f, Loader=loader)
+        except yaml.YAMLError as ex:
+            raise ValueError(str(ex))
+
+
+def _load_json_vars(path):
+    with open(path, 'r') as f:
+        return fast_json.load(f)
+
+
+VARS_LOADERS = {
+    '.py': _load_python_vars,
+    '.yml': _load_yaml_vars,
+    '.yaml': _load_yaml_vars,
+    '.json': _load_json_vars,
+}
+
+
+def _import_vars(varsfile):
+    """returns the vars dict of a varsfile
+
+    A python varsfile should contain a dict named `VARS` while a yaml or
+    json varsfile should contain a single mapping. Parsed vars are kept
+    in memory for as long as the varsfile's mtime and size remain the same
+    so that rendering many times from the same varsfile only parses it
+    once.
+
+    :param string varsfile: path to varsfile
+    :rtype: `dict`
+    """
+    path = os.path.abspath(varsfile)
+    try:
+        stat = os.stat(path)
+    except OSError:
+        raise JockerError('missing vars file: {0}'.format(varsfile))
+    cached = _vars_cache.get(path)
+    if cached and cached[0] == (stat.st_mtime, stat.st_size):
+        return cached[1]
+
+    jocker_lgr.debug('importing vars from: {0}', varsfile)
+    loader = VARS_LOADERS.get(
+        os.path.splitext(path)[1].lower(), _load_python_vars)
+    try:
+        variables = loader(path)
+    except IOError:
+        raise JockerError('missing vars file: {0}'.format(varsfile))
+    except (SyntaxError, ValueError):
+        raise JockerError('bad vars file: {0}'.format(varsfile))
+    if not isinstance(variables, dict):
+        raise JockerError('vars must be a mapping: {0}'.format(varsfile))
+    _vars_cache[path] = ((stat.st_mtime, stat.st_size), variables)
+    return variables
+
+
+def _iter_json_objects(chunks):
+    """yields each JSON object found in a stream of chunks as a string
+
+    The docker daemon streams its output as JSON objects. Several objects
+    may arrive in a single chunk (sometimes without any separator) and a
+    single object may be split across chunks. This keeps track of curly
+    braces and of strings (so that braces inside values are ignored) across
+    chunks, so that each object is yielded as soon as it's complete and only
+    the object currently being read is held in memory.
+
+    :param chunks: an iterable of strings.
+    """
+    depth = 0
+    in_string = False
+    escaped = False
+    parts = []
+    for chunk in chunks:
+        # the offset in the chunk at which the current object begins.
+        start = 0 if depth else None
+        pos = 0
+        length = len(chunk)
+        while pos < length:
+            if escaped:
+                # skip the escaped character, which may be the first one of
+                # this chunk if the backslash ended the previous one.
+                escaped = False
+                pos += 1
+            elif in_string:
+                match = _JSON_STRING_SPECIAL_CHARS.search(chunk, pos)
+                if not match:
+                    break
+                pos = match.end()
+                if match.group() == '\\':
+                    escaped = True
+                else:
+                    in_string = False
+            else:
+                match = _JSON_SPECIAL_CHARS.search(chunk, pos)
+                if not match:
+                    break
+                pos = match.end()
+                char = match.group()
+                if char == '{':
+                    if not depth:
+                        start = match.start()
+                    depth += 1
+                elif not depth:
+                    # anything outside of an object is meaningless.
+                    continue
+                elif char == '"':
+                    in_string = True
+                else:
+                    depth -= 1
+                    if not depth:
+                        parts.append(chunk[start:pos])
+                        yield ''.join(parts)
+                        parts = []
+                        start = None
+        if depth:
+            parts.append(chunk[start:])
+
+
+def _iter_json_events(chunks, markers=None):
+    """yields each decoded JSON object found in a stream of chunks
+
+    Unless debug logging or events are enabled, objects which contain none
+    of `markers` are skipped without being decoded, as they'd only be
+    logged.
+
+    :param chunks: an iterable of strings.
+    :param tuple markers: substrings of the objects the caller acts on.
+    """
+    if markers and (jocker_lgr.isEnabledFor(logging.DEBUG) or
+                    events.enabled):
+        markers = None
+    for obj in _iter_json_objects(chunks):
+        if markers and not any(m in obj for m in markers):
+            continue
+        try:
+            yield json.loads(obj)
+        except ValueError:
+            jocker_lgr.debug('skipping undecodable output: {0}', obj)
+
+
+def _normalize_image(image):
+    """returns `image` with an explicit tag (`latest` if it has none)
+
+    :param string image: repository[:tag]
+    """
+    if '@' in image:
+        return image
+    # a colon before the last slash belongs to a registry's port.
+    if ':' in image.rsplit('/', 1)[-1]:
+        return image
+    return '{0}:latest'.format(image)
+
+
+class _RecordCache():
+    """maps keys to records of previous work, e.g. the inputs of builds to
+    the ids of the images they produced.
+
+    The cache is kept as a json file so that it's shared by all jocker
+    processes. Only the most recently set `max_entries` are kept.
+    """
+
+    def __init__(self, path, max_entries=DEFAULT_RECORD_CACHE_MAX_ENTRIES):
+        self.path = path
+        self.max_entries = max_entries
+        self._lock = threading.Lock()
+
+    def _load(self):
+        try:
+            with open(self.path, 'r') as f:
+                return json.load(f)
+        except (IOError, ValueError):
+            return {}
+
+    def _save(self, entries):
+        if len(entries) > self.max_entries:
+            for key, _ in sorted(entries.items(), key=lambda e: e[1][1])[
+                    :len(entries) - self.max_entries]:
+                del entries[key]
+        cache_dir = os.path.dirname(self.path)
+        try:
+            if not os.path.isdir(cache_dir):
+                os.makedirs(cache_dir)
+            _write_file(self.path, json.dumps(entries))
+        except (IOError, OSError) as ex:
+            jocker_lgr.debug('failed to save {0} ({1})', self.path, ex)
+
+    def get(self, key):
+        with self._lock:
+            entry = self._load().get(key)
+        return entry[0] if entry else None
+
+    def set(self, key, record):
+        with self._lock:
+            entries = self._load()
+            entries[key] = [record, time.time()]
+            self._save(entries)
+
+    def discard(self, key):
+        with self._lock:
+            entries = self._load()
+            if entries.pop(key, None):
+                self._save(entries)
+
+
+def _split_targets(targets):
+    """returns a list of image:tag targets
+
+    :param targets: a list or a comma separated string of targets
+    """
+    if not targets:
+        return []
+    if isinstance(targets, basestring):
+        targets = targets.split(',')
+    return [t.strip() for t in targets if t.strip()]
+
+
+def _parse_image_name(image):
+    """returns the repository and tag (or None) of an image name
+
+    A reference by digest (repository@sha256:...) is returned whole, with
+    no tag, as the colon in it belongs to the digest.
+
+    :param string image: repository[:tag] or repository@digest
+    :rtype: `tuple`
+    """
+    if '@' in image:
+        return image, None
+    # a colon before the last slash belongs to a registry's port.
+    if ':' in image.rsplit('/', 1)[-1]:
+        repository, tag = image.rsplit(':', 1)
+        return repository, tag
+    return image, None
+
+
+@contextlib.contextmanager
+def _unpooled_client(client):
+    yield client
+
+
+class _ClientPool():
+    """keeps idle docker clients by their configuration
+
+    A docker client is a requests session and keeps its connections to the
+    daemon alive. Reusing clients across builds and pushes in a process
+    saves reconnecting for each of them. A client is only ever used by
+    a single thread at a time, so clients may be taken from worker threads.
+    """
+
+    def __init__(self):
+        self._idle = {}
+        self._lock = threading.Lock()
+
+    @contextlib.contextmanager
+    def client(self, config):
+        """a context manager providing a client configured with `config`
+
+        :param dict config: docker-py client configuration
+        """
+        key = json.dumps(config, sort_keys=True)
+        with self._lock:
+            idle = self._idle.get(key)
+            client = idle.pop() if idle else None
+        if client is None:
+            jocker_lgr.debug('initializing docker client with config: {0}',
+                             config)
+            import docker
+            client = docker.Client(**config)
+        try:
+            yield client
+        finally:
+            with self._lock:
+                self._idle.setdefault(key, []).append(client)
+
+
+_client_pool = _ClientPool()
+_build_cache = _RecordCache(DEFAULT_BUILD_CACHE_FILE)
+_push_records = _RecordCache(DEFAULT_PUSH_RECORDS_FILE)
+
+
+def _write_file(path, content, only_if_changed=False):
+    """atomically writes content to a file
+
+    The content is written to a temp file alongside `path` and renamed
+    over it so that readers never see a partially written file.
+    If `only_if_changed` is true and the file already holds the exact same
+    content, it's left untouched so that its mtime doesn't change.
+
+    :param string path: path to write to
+    :param string content: content to write
+    :param bool only_if_changed: only write if the content differs.
+    :rtype: `bool` stating whether the file was written.
+    """
+    from context import _hash
+    if only_if_changed and os.path.isfile(path) and \
+            os.path.getsize(path) == len(content) and \
+            _hash(path) == hashlib.sha1(content).hexdigest():
+        jocker_lgr.debug('{0} is unchanged', path)
+        return False
+    return _write_chunks(path, [content])
+
+
+def _encode_blocks(chunks, encoding='utf-8',
+                   block_size=DEFAULT_RENDER_BLOCK_SIZE):
+    """yields the (many, small) chunks of text a template renders to,
+    joined into encoded blocks of `block_size` chunks each.
+    """
+    chunks = iter(chunks)
+    while True:
+        block = list(itertools.islice(chunks, block_size))
+        if not block:
+            return
+        yield ''.join(block).encode(encoding)
+
+
+def _write_chunks(path, chunks, only_if_changed=False):
+    """atomically writes content to a file as it's produced
+
+    Each chunk is written to a temp file alongside `path` (and hashed) as
+    soon as it's produced, so the content is never held in memory as a
+    whole. Once complete, the temp file is renamed over `path` (see
+    `_write_file`). If producing the content fails, `path` is left
+    untouched.
+
+    :param string path: path to write to
+    :param chunks: an iterable of strings to write.
+    :param bool only_if_changed: only replace the file if the content
+     differs.
+    :rtype: `bool` stating whether the file was written.
+    """
+    fd, tmp_path = tempfile.mkstemp(
+        dir=os.path.dirname(os.path.abspath(path)), prefix='.jocker-')
+    try:
+        digest = hashlib.sha1()
+        size = 0
+        with os.fdopen(fd, 'wb') as f:
+            for chunk in chunks:
+                digest.update(chunk)
+                size += len(chunk)
+                f.write(chunk)
+        from context import _hash
+        if only_if_changed and os.path.isfile(path) and \
+                os.path.getsize(path) == size and \
+                _hash(path) == digest.hexdigest():
+            jocker_lgr.debug('{0} is unchanged', path)
+            return False
+        if os.path.isfile(path):
+            shutil.copymode(path, tmp_path)
+        else:
+            os.chmod(tmp_path, 0o666 & ~_UMASK)
+        if os.name == 'nt' and os.path.isfile(path):
+            os.remove(path)
+        os.rename(tmp_path, path)
+        tmp_path = None
+        return True
+    finally:
+        if tmp_path and os.path.exists(tmp_path):
+            os.remove(tmp_path)
+
+
+def _expand_varsfiles(varsfiles):
+    """returns a sorted list of varsfiles from paths and glob patterns
+
+    :param varsfiles: a list of paths or glob patterns or a comma
+     separated string of them.
+    :rtype: `list`
+    """
+    if isinstance(varsfiles, basestring):
+        varsfiles = varsfiles.split(',')
+    expanded = []
+    for pattern in varsfiles:
+        pattern = pattern.strip()
+        # a path which doesn't exist is kept so that it's reported as a
+        # failed variant rather than silently dropped.
+        matches = sorted(glob.glob(pattern)) or [pattern]
+        for match in matches:
+            if match and match not in expanded:
+                expanded.append(match)
+    return expanded
+
+
+def _init_worker(is_verbose_output):
+    """initializes a matrix worker process (see `execute_matrix`)"""
+    logger.after_fork()
+    _set_global_verbosity_level(is_verbose_output)
+
+
+def _render_variant(args):
+    """renders a single variant of a matrix.
+
+    This runs inside the worker pool, so instead of exiting or raising,
+    any failure is returned to the parent process to be reported. So are
+    the timings recorded while rendering, for the parent to merge.
+
+    :param tuple args: varsfile, templatefile, outputfile and whether to
+     skip writing unchanged outputfiles.
+    :rtype: `dict`
+    """
+    varsfile, templatefile, outputfile, skip_unchanged = args
+    result = {
+        'varsfile': varsfile,
+        'outputfile': outputfile,
+        'changed': False,
+        'error': None
+    }
+    mark = timings.mark()
+    try:
+        j = Jocker(varsfile, templatefile, outputfile,
+                   skip_unchanged=skip_unchanged)
+        j.generate()
+        result['changed'] = j.changed
+    except (Exception, SystemExit) as ex:
+        result['error'] = str(ex) or type(ex).__name__
+    result['timings'] = timings.pop(mark)
+    return result
+
+
+def execute_matrix(varsfiles, templatefile, outputfile=None, workers=None,
+                   verbose=False, skip_unchanged=False, build=None,
+                   configfile=None):
+    """generates a Dockerfile for each varsfile from a single template
+
+    Variants are rendered across a pool of worker processes. The name of
+    each varsfile (sans extension) is substituted for `{name}` in
+    `outputfile` to get the path of the Dockerfile it generates.
+    If build is supplied, an image is built from each Dockerfile and
+    committed to `build` (in which `{name}` is substituted as well).
+    Images whose Dockerfiles are based on another image in the matrix are
+    built after it while all other images are built concurrently.
+
+    :param varsfiles: list or comma separated string of paths or globs.
+    :param string templatefile: path to template file to use.
+    :param string outputfile: output path pattern containing `{name}`.
+    :param int workers: number of worker processes to render with.
+    :param bool verbose: verbose output.
+    :param bool skip_unchanged: only write outputfiles which changed.
+    :param string build: the image:tag pattern to build to.
+    :param string configfile: path to yaml file with docker-py config.
+    :rtype: `list` of `dict`s describing each variant's outcome.
+    """
+    _set_global_verbosity_level(verbose)
+    templatefile = templatefile or DEFAULT_TEMPLATEFILE
+    outputfile = outputfile or DEFAULT_MATRIX_OUTPUTFILE
+    import multiprocessing
+    workers = int(workers or multiprocessing.cpu_count())
+    varsfiles = _expand_varsfiles(varsfiles)
+
+    if not os.path.exists(templatefile):
+        jocker_lgr.error('template file does not exist in {0}', templatefile)
+        if verbose_output:
+            raise JockerError('template file missing')
+        sys.exit(508)
+    if len(varsfiles) > 1 and '{name}' not in outputfile:
+        jocker_lgr.error('outputfile must contain {{name}} when rendering '
+                         'more than a single variant ({0})', outputfile)
+        sys.exit(102)
+
+    variants = []
+    for varsfile in varsfiles:
+        name = os.path.splitext(os.path.basename(varsfile))[0]
+        variant_outputfile = outputfile.format(name=name)
+        output_dir = os.path.dirname(variant_outputfile)
+        if output_dir and not os.path.isdir(output_dir):
+            os.makedirs(output_dir)
+        variants.append(
+            (varsfile, templatefile, variant_outputfile, skip_unchanged))
+    jocker_lgr.info('rendering {0} variants using {1} workers', len(variants),
+                    workers)
+
+    if workers > 1 and len(variants) > 1:
+        # the workers are forked, so the listener thread mustn't be in the
+        # midst of handling records (and holding the handlers' locks).
+        logger.flush()
+        pool = multiprocessing.Pool(
+            workers, _init_worker, (verbose_output,))
+        chunksize = max(1, len(variants) // (workers * 4))
+        results = pool.imap_unordered(_render_variant, variants, chunksize)
+    else:
+        pool = None
+        results = (_render_variant(variant) for variant in variants)
+
+    report = []
+    try:
+        for result in results:
+            timings.extend(result.pop('timings'))
+            if result['error']:
+                jocker_lgr.error('failed to render {0} ({1})',
+                                 result['varsfile'], result['error'])
+            else:
+                jocker_lgr.info('rendered {0} -> {1}{2}', result['varsfile'],
+                                result['outputfile'],
+                                '' if result['changed'] else ' (unchanged)')
+            report.append(result)
+    finally:
+        if pool:
+            pool.close()
+            pool.join()
+
+    failed = [r for r in report if r['error']]
+    jocker_lgr.info('{0}/{1} variants rendered successfully',
+                    len(report) - len(failed), len(report))
+    if failed:
+        if verbose_output:
+            raise JockerError('failed to render {0} variants'.format(
+                len(failed)))
+        sys.exit(102)
+    if build:
+        _build_matrix(report, templatefile, build, configfile, workers)
+    return report
+
+
+def _build_matrix(report, templatefile, build, configfile, workers):
+    """builds the images of a rendered matrix using a `Scheduler` and
+    adds the image and build status of each variant to its report.
+    """
+    from scheduler import Scheduler
+    jockers = []
+    for result in report:
+        name = os.path.splitext(os.path.basename(result['varsfile']))[0]
+        result['image'] = build.format(name=name)
+        jockers.append(Jocker(
+            result['varsfile'], templatefile, result['outputfile'],
+            configfile, build=result['image']))
+    try:
+        statuses = Scheduler(jockers, workers).run()
+    except JockerError as ex:
+        jocker_lgr.error(str(ex))
+        if verbose_output:
+            raise
+        sys.exit(101)
+    for result in report:
+        result['build'] = statuses[_normalize_image(result['image'])]
+    if [s for s in statuses.values() if s != 'built']:
+        if verbose_output:
+            raise JockerError('failed to build all images')
+        sys.exit(101)
+
+
 def execute(varsfile, templatefile, outputfile=None, configfile=None,
-            dryrun=False, build=False, push=False, verbose=False):
+            dryrun=False, build=False, push=False, verbose=False,
+            skip_unchanged=False, watch=False, skip_pushed=False):
     """generates a Dockerfile, builds an image and pushes it to DockerHub
 
     A `Dockerfile` will be generated by Jinja2 according to the `varsfile`
@@ -82,6 +793,15 @@ def execute(varsfile, templatefile, outputfile=None, configfile=None,
     image:tag string supplied to `build`.
     If push is true, a build will be triggered and the produced image
     will be pushed to DockerHub upon completion.
+    If skip_unchanged is true, an `outputfile` which already holds the
+    generated content will not be rewritten. Whether it `changed` is
+    reported so that callers can decide what to do about it, an image is
+    still built (unless the build cache has it) and pushed from it.
+    If watch is true, the `outputfile` will be regenerated (and an image
+    built from it if build is supplied) whenever the template, any of the
+    templates it depends on or the `varsfile` changes, until interrupted.
+    If skip_pushed is true, targets which the image is recorded as pushed
+    to (by the same daemon, as the same registry user) are skipped.
 
     :param string varsfile: path to file with variables.
     :param string templatefile: path to template file to use.
@@ -90,184 +810,523 @@ def execute(varsfile, templatefile, outputfile=None, configfile=None,
     :param bool dryrun: mock run.
     :param build: False or the image:tag to build to.
     :param push: False or the image:tag to build to. (triggers build)
+     a list (or comma separated string) of image:tags can be supplied in
+     which case the image is built once, tagged as each of them and pushed
+     to all of them.
     :param bool verbose: verbose output.
+    :param bool skip_unchanged: only write the outputfile if it changed.
+    :param bool watch: keep regenerating on change.
+    :param bool skip_pushed: don't push an image to a target again.
+    :rtype: the generated content if dryrun, otherwise a `dict` stating
+     the `outputfile`, whether it `changed`, the built `image`'s id, size
+     and digests and the `pushed` targets' report.
     """
     if dryrun and (build or push):
         jocker_lgr.error('dryrun requested, cannot build.')
         sys.exit(100)
+    if watch and push:
+        jocker_lgr.error('cannot push while watching.')
+        sys.exit(100)
 
     _set_global_verbosity_level(verbose)
     j = Jocker(varsfile, templatefile, outputfile, configfile, dryrun,
-               build, push)
-    formatted_text = j.generate()
-    if dryrun:
-        g = j.dryrun(formatted_text)
-    if build or push:
-        j.build_image()
-    if push:
-        j.push_image()
-    if dryrun:
-        return g
+               build, push, skip_unchanged)
+    if watch:
+        from watcher import Watcher
+        return Watcher(j, build=bool(build)).run()
+    outcome = j.run(skip_pushed)
+    return j.dryrun(outcome) if dryrun else outcome
+
+
+class Renderer():
+    """renders a template with any number of vars dicts, in memory
+
+    The template is loaded and compiled once, when the renderer is
+    created, so rendering many variants of it costs no more than the
+    rendering itself:
+
+        renderer = Renderer('Dockerfile.template')
+        for variables in variants:
+            text = renderer.render(variables)
+
+    Unlike `Jocker`, which exits on failure as the cli does, errors are
+    raised as `JockerError`s.
+    """
+
+    def __init__(self, templatefile, cache_dir=DEFAULT_CACHE_DIR):
+        """
+        :param string templatefile: path to template file to use.
+        :param string cache_dir: directory to cache compiled templates in.
+        """
+        if not os.path.isfile(templatefile):
+            raise JockerError('template file missing: {0}'.format(
+                templatefile))
+        self.templatefile = templatefile
+        env = _get_environment(os.path.dirname(templatefile), cache_dir)
+        try:
+            with timings.phase('compile'):
+                self.template = env.get_template(
+                    os.path.basename(templatefile))
+        except jinja2.TemplateError as ex:
+            raise JockerError('could not load template: ({0})'.format(ex))
+
+    @staticmethod
+    def _check(variables):
+        if not isinstance(variables, dict):
+            raise JockerError('vars must be a mapping')
+
+    def render(self, variables):
+        """returns the template rendered with `variables` as a string
+
+        :param dict variables: the vars to render with.
+        :rtype: `unicode`
+        """
+        self._check(variables)
+        try:
+            with timings.phase('render'):
+                return self.template.render(variables)
+        except jinja2.TemplateError as ex:
+            raise JockerError('could not generate template: ({0})'.format(
+                ex))
+
+    def stream(self, variables):
+        """yields the template rendered with `variables` chunk by chunk,
+        so that the rendered text is never held in memory as a whole.
+
+        :param dict variables: the vars to render with.
+        """
+        self._check(variables)
+        try:
+            for chunk in self.template.generate(variables):
+                yield chunk
+        except jinja2.TemplateError as ex:
+            raise JockerError('could not generate template: ({0})'.format(
+                ex))
+
+    def dump(self, variables, fileobj, encoding='utf-8'):
+        """writes the template rendered with `variables` to `fileobj`
+        chunk by chunk (see `stream`).
+
+        :param dict variables: the vars to render with.
+        :param fileobj: a file like object to write to.
+        :param string encoding: encoding to write the text in. None writes
+         the text as is (e.g. to a file opened in text mode).
+        """
+        for chunk in self.stream(variables):
+            fileobj.write(chunk.encode(encoding) if encoding else chunk)
 
 
 class Jocker():
 
     def __init__(self, varsfile, templatefile, outputfile=None,
-                 configfile=None, dryrun=False, build=False, push=False):
+                 configfile=None, dryrun=False, build=False, push=False,
+                 skip_unchanged=False, variables=None):
         self.varsfile = varsfile if varsfile else DEFAULT_VARSFILE
+        # vars supplied as a dict are rendered instead of the varsfile's.
+        self.variables = variables
         templatefile = templatefile if templatefile \
             else DEFAULT_TEMPLATEFILE
         self.outputfile = outputfile if outputfile else DEFAULT_OUTPUTFILE
         self.configfile = configfile
         self.is_dryrun = dryrun
         self.build = build
-        self.push = push
+        self.push_targets = _split_targets(push)
+        self.push = self.push_targets[0] if self.push_targets else push
+        self.skip_unchanged = skip_unchanged
+        self.changed = False
+        self.c = None
+        self.repository, self.tag = _parse_image_name(
+            build or self.push) if build or self.push else (None, None)
+        self.image_id = None
+        self.image_info = None
+        self.build_error = None
+        self.context_digest = None
 
-        docker_config = _import_config(configfile) if configfile \
-            else DEFAULT_DOCKER_CONFIG
+        with timings.phase('config'):
+            docker_config = _import_config(configfile) if configfile \
+                else DEFAULT_DOCKER_CONFIG
         self.client_config = docker_config.get(
             'client', DEFAULT_DOCKER_CONFIG['client'])
         self.build_config = docker_config.get(
             'build', DEFAULT_DOCKER_CONFIG['build'])
 
         if not os.path.exists(templatefile):
-            jocker_lgr.error('template file does not exist in {0}'.format(
-                templatefile))
+            jocker_lgr.error('template file does not exist in {0}',
+                             templatefile)
             if verbose_output:
                 raise JockerError('template file missing')
             sys.exit(508)
         self.template_dir = os.path.dirname(templatefile)
         self.template_file = os.path.basename(templatefile)
+        self._renderer = None
 
     def _parse_dumb_push_output(self, string):
         """since the push process outputs a single unicode string consisting of
         multiple JSON formatted "status" lines, we need to parse it so that it
         can be read as multiple strings.
 
-        This will receive the string as an input, count curly braces and ignore
-        any newlines. When the curly braces stack is 0, it will append the
-        entire string it has read up until then to a list and so forth.
-
         :param string: the string to parse
         :rtype: list of JSON's
         """
-        stack = 0
-        json_list = []
-        tmp_json = ''
-        for char in string:
-            if not char == '\r' and not char == '\n':
-                tmp_json += char
-            if char == '{':
-                stack += 1
-            elif char == '}':
-                stack -= 1
-            if stack == 0:
-                if not len(tmp_json) == 0:
-                    json_list.append(tmp_json)
-                tmp_json = ''
-        return json_list
-
-    def generate(self):
-
-        jocker_lgr.debug('template file: {0}'.format(self.template_file))
-        jocker_lgr.debug('vars source: {0}'.format(self.varsfile))
-        jocker_lgr.debug('template dir: {0}'.format(self.template_dir))
-
-        if not self.is_dryrun:
-            jocker_lgr.info('generating Dockerfile: {0}'.format(
-                os.path.abspath(self.outputfile)))
-        i = Jingen(
-            template_file=self.template_file,
-            vars_source=self.varsfile,
-            output_file=self.outputfile,
-            template_dir=self.template_dir,
-            make_file=not self.is_dryrun
-        )
-        formatted_text = i.generate()
-        if not self.is_dryrun:
-            jocker_lgr.info('Dockerfile generated')
-        jocker_lgr.debug('Output content: \n{0}'.format(formatted_text))
+        return list(_iter_json_objects([string]))
+
+    def generate(self, fileobj=None):
+        """renders the template with the varsfile's vars
+
+        Unless dryrun, the rendered text is streamed chunk by chunk to the
+        outputfile (or to `fileobj`, if supplied) so that it's never held
+        in memory as a whole, however large it may be.
+
+        :param fileobj: a file like object to write the rendered text to
+         (utf-8 encoded) rather than to the outputfile.
+        :rtype: the rendered text if dryrun, otherwise None.
+        """
+        jocker_lgr.debug('template file: {0}', self.template_file)
+        jocker_lgr.debug('vars source: {0}', self.varsfile)
+        jocker_lgr.debug('template dir: {0}', self.template_dir)
+
+        if not self.is_dryrun and fileobj is None:
+            jocker_lgr.info('generating Dockerfile: {0}',
+                            os.path.abspath(self.outputfile))
+        env = _get_environment(self.template_dir)
+        formatted_text = None
+        try:
+            with timings.phase('compile'):
+                template = env.get_template(self.template_file)
+            with timings.phase('vars'):
+                template_vars = self.variables if self.variables is not None \
+                    else _import_vars(self.varsfile)
+            with timings.phase('render'):
+                if self.is_dryrun:
+                    formatted_text = template.render(template_vars)
+                else:
+                    chunks = _encode_blocks(
+                        template.generate(template_vars))
+                    self.changed = self._write_output(chunks, fileobj)
+        except jinja2.TemplateError as ex:
+            raise JockerError('could not generate template: ({0})'.format(
+                ex))
+        if formatted_text is not None:
+            jocker_lgr.debug('Output content: \n{0}', formatted_text)
+        elif fileobj is None:
+            jocker_lgr.info('Dockerfile generated' if self.changed
+                            else 'Dockerfile unchanged')
+        events.emit('render', outputfile=self.outputfile,
+                    changed=self.changed, dryrun=self.is_dryrun)
         return formatted_text
 
+    def _write_output(self, chunks, fileobj=None):
+        if fileobj is not None:
+            for chunk in chunks:
+                fileobj.write(chunk)
+            return True
+        try:
+            return _write_chunks(self.outputfile, chunks,
+                                 only_if_changed=self.skip_unchanged)
+        except (IOError, OSError):
+            raise JockerError('could not write to file {0}'.format(
+                self.outputfile))
+
+    def render(self, variables):
+        """returns the template rendered with `variables` in memory,
+        without importing the varsfile or writing the outputfile.
+
+        The template is compiled on the first call only (see `Renderer`).
+
+        :param dict variables: the vars to render with.
+        :rtype: `unicode`
+        """
+        if self._renderer is None:
+            self._renderer = Renderer(
+                os.path.join(self.template_dir, self.template_file))
+        return self._renderer.render(variables)
+
+    def run(self, skip_pushed=False):
+        """generates the Dockerfile and, as requested, builds the image,
+        tags it as each of the push targets and pushes it to them.
+
+        :param bool skip_pushed: skip targets already pushed to.
+        :rtype: the generated content if dryrun, otherwise a `dict` stating
+         the `outputfile`, whether it `changed`, the built `image`'s id,
+         size and digests and the `pushed` targets' report.
+        """
+        formatted_text = self.generate()
+        if self.is_dryrun:
+            return formatted_text
+        report = None
+        if self.build or self.push:
+            self.build_image()
+        if self.push:
+            self.tag_image()
+            report = self.push_image(self.push_targets, skip_pushed)
+        return {'outputfile': self.outputfile, 'changed': self.changed,
+                'image': self.image_info, 'pushed': report}
+
     def dryrun(self, text):
         jocker_lgr.info(
-            'dryrun requested, potential Dockerfile content is: \n{0}'.format(
-                text))
+            'dryrun requested, potential Dockerfile content is: \n{0}', text)
         return text
 
+    def client(self):
+        """returns a context manager providing a docker client
+
+        Unless a client was explicitly set as `c`, a client is taken from
+        the process wide pool for the duration of the context.
+        """
+        if self.c is not None:
+            return _unpooled_client(self.c)
+        return _client_pool.client(self.client_config)
+
     def build_image(self):
-        try:
-            # define repository and tag for image
-            self.repository, self.tag = self.build.split(':') if self.build \
-                else self.push.split(':')
-        except ValueError:
-            # maybe tag wasn't supplied...
-            self.repository = self.build if self.build else self.push
-            self.tag = None
-        jocker_lgr.debug('initializing docker client with config: {0}'.format(
-            self.client_config))
-        self.c = docker.Client(**self.client_config)
         build_path = os.path.dirname(os.path.abspath(self.outputfile))
-        jocker_lgr.info('Creating Image: {0}:{1}'.format(
-            self.repository, self.tag))
-        jocker_lgr.debug('building docker image from file: {0}'.format(
-            os.path.join(build_path, self.outputfile)))
-        jocker_lgr.debug('Docker build config is: {0}'.format(
-            self.build_config))
+        jocker_lgr.info('Creating Image: {0}:{1}', self.repository, self.tag)
+        jocker_lgr.debug('building docker image from file: {0}',
+                         os.path.join(build_path, self.outputfile))
+        jocker_lgr.debug('Docker build config is: {0}', self.build_config)
         if self.is_dryrun:
             jocker_lgr.debug('dryrun requested, skipping build process.')
             return
+        build_config = dict(self.build_config)
+        cache_key = None
+        context = None
+        with self.client() as c:
+            try:
+                try:
+                    if not build_config.get('fileobj'):
+                        # rather than letting docker-py tar the entire
+                        # build path on every build, a cached tarball is
+                        # used for as long as the (.dockerignore'd)
+                        # context doesn't change.
+                        from context import build_context
+                        with timings.phase('context'):
+                            context_file, self.context_digest = \
+                                build_context(build_path,
+                                              build_config.get('encoding'),
+                                              dockerfile=self.outputfile)
+                        cache_key = self._get_build_cache_key(c)
+                        if not build_config.get('nocache') and \
+                                self._tag_cached_image(c, cache_key):
+                            return
+                        context = open(context_file, 'rb')
+                        build_config['fileobj'] = context
+                        build_config['custom_context'] = True
+                except Exception as e:
+                    self._fail_build(e)
+                # the daemon builds while its output is read, so both are
+                # timed as a single build.
+                with timings.phase('build'):
+                    try:
+                        build_results = c.build(
+                            path=build_path, tag=self.build or self.push,
+                            **build_config)
+                    except Exception as e:
+                        self._fail_build(e)
+                    self._read_build_output(build_results)
+            finally:
+                if context:
+                    context.close()
+            if self.build_error:
+                jocker_lgr.error('failed to generate image')
+                sys.exit(101)
+            self._verify_image(c)
+        if cache_key:
+            _build_cache.set(cache_key, self.image_id)
+        jocker_lgr.info('image generation complete ({0}, {1} bytes)',
+                        self.image_id, self.image_info['size'])
+        self._emit_image(cached=False)
+
+    def _emit_image(self, cached):
+        events.emit('image', build=self.build or self.push, cached=cached,
+                    **self.image_info)
+
+    def _fail_build(self, e):
+        jocker_lgr.error('failed to generate image ({0})', e)
+        self._emit_build_error(str(e))
+        sys.exit(101)
+
+    def _emit_build_error(self, message):
+        events.emit('error', phase='build', build=self.build or self.push,
+                    message=message)
+
+    def _verify_image(self, c):
+        """verifies that the built image exists and records its details"""
+        import docker
+        image = self.image_id or self.build or self.push
         try:
-            build_results = self.c.build(
-                path=build_path, tag=self.build or self.push,
-                **self.build_config)
-        except Exception as e:
-            jocker_lgr.error('failed to generate image ({0})'.format(e))
+            info = c.inspect_image(image)
+        except docker.errors.APIError as e:
+            jocker_lgr.error('image {0} does not exist ({1})', image, e)
+            self._emit_build_error(str(e))
             sys.exit(101)
-        # parse output. Um.. this parser makes 'build' work.. err.. wtf?
+        self._record_image(info)
+
+    def _record_image(self, info):
+        """records the id, size, layer digests and repository digests of
+        the image as returned by the daemon's inspect call.
+        """
+        self.image_id = info.get('Id') or self.image_id
+        self.image_info = {
+            'id': self.image_id,
+            'size': info.get('Size'),
+            'layers': (info.get('RootFS') or {}).get('Layers') or [],
+            'digests': info.get('RepoDigests') or [],
+        }
+
+    def _read_build_output(self, build_results):
+        """logs the build's output as it arrives from the daemon and
+        records the id of the image it built.
+        """
+        if isinstance(build_results, tuple):
+            # older api versions don't stream and return the build's
+            # (image_id, output) instead.
+            build_results = [build_results[1]]
         jocker_lgr.info('waiting for build process to finish, please hold...')
-        lines = [line for line in build_results]
+        self.image_id = None
+        self.build_error = None
+        for event in _iter_json_events(build_results, BUILD_OUTPUT_MARKERS):
+            if 'stream' in event:
+                line = event['stream'].rstrip('\n')
+                jocker_lgr.debug(line)
+                events.emit('build_output', build=self.build or self.push,
+                            line=line)
+                match = BUILD_SUCCESS_RE.match(line)
+                if match:
+                    self.image_id = match.group(1)
+                elif events.enabled:
+                    match = BUILD_STEP_RE.match(line)
+                    if match:
+                        events.emit('build_step',
+                                    build=self.build or self.push,
+                                    step=int(match.group(1)),
+                                    instruction=match.group(2))
+            elif 'error' in event:
+                self.build_error = event['error']
+                jocker_lgr.error(event['error'])
+                self._emit_build_error(event['error'])
+            else:
+                jocker_lgr.debug(event)
+
+    def _get_build_cache_key(self, c):
+        """returns a key identifying the inputs of the build: the
+        Dockerfile, the images its `FROM` lines currently refer to, the
+        build context, the daemon and the build options which affect the
+        resulting image.
+        """
+        from context import _hash
+        options = dict((k, v) for k, v in self.build_config.items()
+                       if k not in BUILD_CACHE_IGNORED_OPTIONS)
+        return hashlib.sha1(json.dumps([
+            _hash(self.outputfile),
+            self._get_parent_ids(c),
+            self.context_digest,
+            self.client_config.get('base_url'),
+            options
+        ], sort_keys=True)).hexdigest()
+
+    def _get_parent_ids(self, c):
+        """returns the ids of the images the Dockerfile is based on, so that
+        a parent which was rebuilt or re-pulled under the same tag
+        invalidates the cached image. A parent the daemon doesn't have
+        (yet) has no id.
+        """
+        import docker
+        from scheduler import _parse_parents
+        parent_ids = []
+        for parent in _parse_parents(self.outputfile):
+            try:
+                parent_ids.append(c.inspect_image(parent)['Id'])
+            except docker.errors.APIError:
+                parent_ids.append(None)
+        return parent_ids
+
+    def _tag_cached_image(self, c, cache_key):
+        """tags the image previously built from identical inputs, if it
+        still exists, rather than building it again.
+
+        :rtype: `bool` stating whether a cached image was used.
+        """
+        import docker
+        image_id = _build_cache.get(cache_key)
+        if not image_id:
+            return False
         try:
-            parsed_lines = [json.loads(i).get('stream', '') for i in lines]
-        except ValueError:
-            # sometimes all the data is sent in a single line ????
-            #
-            # ValueError: Extra data: line 1 column 87 - line 1 column
-            # 33268 (char 86 - 33267)
-            line = lines[0]
-            # This ONLY works because every line is formatted as
-            # {"stream": STRING}
-            parsed_lines = [
-                json.loads(obj).get('stream', '') for obj in
-                re.findall('{\s*"stream"\s*:\s*"[^"]*"\s*}', line)
-            ]
-        for line in parsed_lines:
-            jocker_lgr.debug(line)
-        # TODO: (IMPRV) verify image exists
-        jocker_lgr.info('image generation complete')
-
-    def push_image(self):
-        jocker_lgr.info('pushing {0}:{1}'.format(self.repository, self.tag))
+            info = c.inspect_image(image_id)
+        except docker.errors.APIError:
+            jocker_lgr.debug('cached image {0} no longer exists', image_id)
+            _build_cache.discard(cache_key)
+            return False
+        jocker_lgr.info('build inputs unchanged, tagging cached image {0}',
+                        image_id)
+        c.tag(image_id, self.repository, tag=self.tag, force=True)
+        self.image_id = image_id
+        self.build_error = None
+        self._record_image(info)
+        self._emit_image(cached=True)
+        return True
+
+    def iter_push_events(self):
+        """pushes the image and yields each event of the push process (as a
+        dict) as soon as it arrives from the daemon.
+        """
+        with self.client() as c:
+            for event in _iter_json_events(
+                    c.push(self.repository, tag=self.tag, stream=True)):
+                yield event
+
+    def tag_image(self, targets=None):
+        """tags the built image as each of the targets
+
+        The image is tagged locally so that it's only built once regardless
+        of the number of repositories and tags it's pushed to.
+
+        :param list targets: image:tags to tag as. defaults to all push
+         targets other than the one the image was built as.
+        """
+        source = self.image_id or self.build or self.push
+        targets = [t for t in (targets or self.push_targets)
+                   if t != (self.build or self.push)]
+        for target in targets:
+            repository, tag = _parse_image_name(target)
+            jocker_lgr.info('tagging {0} as {1}', source, target)
+            if self.is_dryrun:
+                continue
+            try:
+                with timings.phase('tag'):
+                    with self.client() as c:
+                        c.tag(source, repository, tag=tag, force=True)
+            except Exception as e:
+                jocker_lgr.error('failed to tag image ({0})', e)
+                if verbose_output:
+                    raise JockerError(e)
+                sys.exit(101)
+
+    def push_image(self, targets=None, skip_pushed=False):
+        """pushes the image to one or more repository:tag targets
+
+        All targets are pushed concurrently (see `Pusher`) and a single
+        report is returned once they're all done. If skip_pushed is true,
+        targets which the built image is recorded as pushed to are skipped.
+
+        :param list targets: targets to push to. defaults to the image.
+        :param bool skip_pushed: skip targets already pushed to.
+        :rtype: `list` of `dict`s describing each push.
+        """
+        targets = targets or self.push_targets or [self.build]
         if self.is_dryrun:
+            jocker_lgr.info('pushing {0}', ', '.join(targets))
             jocker_lgr.debug('dryrun requested, skipping push process.')
             return
-        try:
-            push_results = self._parse_dumb_push_output(
-                self.c.push(self.repository, tag=self.tag, stream=False))
-        except docker.errors.APIError as e:
-            jocker_lgr.error(e)
-            if verbose_output:
-                raise JockerError(e)
-            sys.exit(500)
-        except socket.timeout as e:
-            jocker_lgr.error(e)
+        from pusher import Pusher
+        with timings.phase('push'):
+            report = Pusher(client=self.client, image_id=self.image_id,
+                            skip_pushed=skip_pushed).push(targets)
+        failed = [result for result in report if result['error']]
+        if failed:
             if verbose_output:
-                raise JockerError(e)
-            sys.exit(408)
-        for line in push_results:
-            jocker_lgr.debug(json.loads(line))
+                raise JockerError(failed[0]['error'])
+            sys.exit(failed[0]['code'])
         jocker_lgr.info('push complete')
-        # TODO: (IMPRV) handle additional errors - see errorslog file
+        return report
 
 
 class JockerError(Exception):
@@ -1,10 +1,17 @@
 import os
 import sys
+import atexit
 import logging
+import threading
 import dictconfig
+try:
+    import queue
+except ImportError:
+    import Queue as queue
 
 DEFAULT_BASE_LOGGING_LEVEL = logging.INFO
 DEFAULT_VERBOSE_LOGGING_LEVEL = logging.DEBUG
+DEFAULT_QUEUE_BATCH_SIZE = 512
 
 LOGGER = {
     "version": 1,
@@ -39,9 +46,252 @@ LOGGER = {
 }
 
 
+class QueueHandler(logging.Handler):
+    """hands records over to a queue rather than emitting them
+
+    Enqueueing never blocks, so the thread logging never waits for the
+    actual handlers (and the disk or console behind them). A process
+    forked after the listener was started (e.g. a matrix worker) has no
+    listener thread draining the queue, so records are handled in place.
+    As the listener thread may have held a handler's lock when the
+    process forked, the handlers' locks are recreated first (see
+    `QueueListener.after_fork`).
+    """
+
+    def __init__(self, listener):
+        logging.Handler.__init__(self)
+        self.listener = listener
+        self.pid = os.getpid()
+
+    def prepare(self, record):
+        # the message is merged now as its args may change by the time the
+        # listener gets to it.
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            if not record.exc_text:
+                record.exc_text = logging.Formatter().formatException(
+                    record.exc_info)
+            record.exc_info = None
+        return record
+
+    def emit(self, record):
+        try:
+            record = self.prepare(record)
+            if os.getpid() != self.pid:
+                self.listener.after_fork()
+                self.listener.handle_batch([record])
+            else:
+                self.listener.queue.put_nowait(record)
+        except Exception:
+            self.handleError(record)
+
+
+class QueueListener():
+    """emits records from a queue using a background thread
+
+    Whatever accumulated in the queue is handled in batches of up to
+    `batch_size` records. Handlers are flushed once per batch rather than
+    once per record, so bursts of output (e.g. verbose build logs) are
+    written to the log file and console in a few large writes.
+    """
+
+    _sentinel = object()
+
+    def __init__(self, handlers, batch_size=DEFAULT_QUEUE_BATCH_SIZE):
+        self.queue = queue.Queue()
+        self.handlers = handlers
+        self.batch_size = batch_size
+        self._thread = None
+        self._pid = os.getpid()
+
+    def start(self):
+        self._thread = threading.Thread(target=self._monitor)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def after_fork(self):
+        """recreates the handlers' locks once in a forked process
+
+        A lock held by a thread of the parent (i.e. the listener thread, in
+        the midst of a batch) when it forked remains held in the child
+        forever, as the thread holding it doesn't exist there.
+        """
+        if os.getpid() == self._pid:
+            return
+        self._pid = os.getpid()
+        self._thread = None
+        for handler in self.handlers:
+            handler.createLock()
+
+    def handle_batch(self, records):
+        for handler in self.handlers:
+            # handlers flush after each record, which is deferred to the end
+            # of the batch.
+            flush = handler.flush
+            handler.flush = lambda: None
+            try:
+                for record in records:
+                    if record.levelno >= handler.level:
+                        handler.handle(record)
+            finally:
+                del handler.flush
+                flush()
+
+    def _monitor(self):
+        while True:
+            records = [self.queue.get()]
+            while len(records) < self.batch_size:
+                try:
+                    records.append(self.queue.get_nowait())
+                except queue.Empty:
+                    break
+            stop = any(r is self._sentinel for r in records)
+            try:
+                records = [r for r in records if r is not self._sentinel]
+                if records:
+                    self.handle_batch(records)
+            finally:
+                for _ in range(len(records) + stop):
+                    self.queue.task_done()
+            if stop:
+                return
+
+    def flush(self):
+        """waits for all records queued so far to be handled"""
+        if self._thread:
+            self.queue.join()
+
+    def stop(self):
+        """handles all records queued so far and stops the thread"""
+        if self._thread:
+            self.queue.put(self._sentinel)
+            self._thread.join()
+            self._thread = None
+
+
+class BraceMessage():
+    """a log message which is formatted using `str.format`, once it's
+    actually emitted.
+    """
+
+    def __init__(self, fmt, args, kwargs):
+        self.fmt = fmt
+        self.args = args
+        self.kwargs = kwargs
+        self._message = None
+
+    def __str__(self):
+        # each handler formats the record, the message is only built once.
+        if self._message is None:
+            self._message = self.fmt.format(*self.args, **self.kwargs)
+        return self._message
+
+
+class BraceLogger():
+    """wraps a logger so that messages are formatted lazily using
+    `str.format`:
+
+        lgr.debug('Output content: \n{0}', text)
+
+    The message is only formatted if the logger is enabled for the level
+    (and then by the first handler to emit the record) so that debug
+    messages cost next to nothing when not verbose. A message without args
+    is logged as is. Anything else (e.g. `setLevel`) is delegated to the
+    wrapped logger.
+    """
+
+    def __init__(self, logger):
+        self.logger = logger
+
+    def __getattr__(self, name):
+        return getattr(self.logger, name)
+
+    def log(self, level, msg, *args, **kwargs):
+        if not self.logger.isEnabledFor(level):
+            return
+        exc_info = kwargs.pop('exc_info', None)
+        if args or kwargs:
+            msg = BraceMessage(msg, args, kwargs)
+        self.logger._log(level, msg, (), exc_info=exc_info)
+
+    def debug(self, msg, *args, **kwargs):
+        self.log(logging.DEBUG, msg, *args, **kwargs)
+
+    def info(self, msg, *args, **kwargs):
+        self.log(logging.INFO, msg, *args, **kwargs)
+
+    def warning(self, msg, *args, **kwargs):
+        self.log(logging.WARNING, msg, *args, **kwargs)
+
+    def error(self, msg, *args, **kwargs):
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+    def critical(self, msg, *args, **kwargs):
+        self.log(logging.CRITICAL, msg, *args, **kwargs)
+
+    def exception(self, msg, *args, **kwargs):
+        kwargs['exc_info'] = True
+        self.log(logging.ERROR, msg, *args, **kwargs)
+
+
+_listener = None
+
+
+def flush():
+    """waits for queued log records to be handled (see `init`)"""
+    if _listener:
+        _listener.flush()
+
+
+def after_fork():
+    """makes logging safe to use in a process forked while logging (e.g.
+    a worker of a `multiprocessing.Pool`). call it first thing in the
+    child.
+    """
+    lgr = logging.getLogger('user')
+    for handler in lgr.handlers:
+        handler.createLock()
+    if _listener:
+        _listener.after_fork()
+
+
+def _stop_listener():
+    global _listener
+    if _listener:
+        _listener.stop()
+        _listener = None
+
+
+atexit.register(_stop_listener)
+
+
+def set_console_stream(stream):
+    """redirects the console handlers' output to `stream` (e.g. to stderr
+    so that stdout carries machine readable output only)
+    """
+    flush()
+    handlers = _listener.handlers if _listener else \
+        logging.getLogger('user').handlers
+    for handler in handlers:
+        # file handlers are stream handlers as well.
+        if type(handler) is logging.StreamHandler:
+            handler.stream = stream
+
+
+def _queue_handlers(lgr):
+    """moves the logger's handlers behind a queue and a listener thread"""
+    global _listener
+    _listener = QueueListener(lgr.handlers[:])
+    for handler in _listener.handlers:
+        lgr.removeHandler(handler)
+    lgr.addHandler(QueueHandler(_listener))
+    _listener.start()
+
+
 def init(base_level=DEFAULT_BASE_LOGGING_LEVEL,
          verbose_level=DEFAULT_VERBOSE_LOGGING_LEVEL,
-         logging_config=None):
+         logging_config=None, queued=False):
     """initializes a base logger
 
     you can use this to init a logger in any of your files.
@@ -52,6 +302,10 @@ def init(base_level=DEFAULT_BASE_LOGGING_LEVEL,
     :param int|logging.LEVEL verbose_level: desired verbose logging level
     :param dict logging_dict: dictConfig based configuration.
      used to override the default configuration from config.py
+    :param bool queued: emit records from a background thread (see
+     `QueueListener`) so that logging never waits for disk or console
+     writes. queued records are handled before the process exits, or
+     on `flush`.
     :rtype: `python logger`
     """
     if logging_config is None:
@@ -69,9 +323,14 @@ def init(base_level=DEFAULT_BASE_LOGGING_LEVEL,
     try:
         if not os.path.exists(log_dir) and not len(log_dir) == 0:
             os.makedirs(log_dir)
+        # records queued for the previous handlers are handled before
+        # they're replaced.
+        _stop_listener()
         dictconfig.dictConfig(logging_config)
         lgr = logging.getLogger('user')
         lgr.setLevel(base_level)
+        if queued:
+            _queue_handlers(lgr)
         return lgr
     except ValueError as e:
         sys.exit('could not initialize logger.'
@@ -0,0 +1,109 @@
+from __future__ import absolute_import
+import os
+import sys
+import threading
+import cProfile
+from jocker.jocker import jocker_lgr
+
+DEFAULT_SAMPLE_INTERVAL = 0.005
+COLLAPSED_EXTENSIONS = ('.collapsed', '.folded')
+
+
+def _format_frame(frame):
+    code = frame.f_code
+    return '{0} ({1}:{2})'.format(
+        code.co_name, os.path.basename(code.co_filename), code.co_firstlineno)
+
+
+class Sampler():
+    """a statistical profiler sampling the stacks of all threads
+
+    Every `interval` seconds (of wall clock time), a daemon thread records
+    the stack of every other thread. Sampling from a thread of its own
+    rather than from a signal handler (which only runs once the main
+    thread executes bytecode again) samples worker threads (i.e.
+    concurrent builds and pushes) even while the main thread waits for
+    them. The samples are written in the collapsed stack format (one
+    `frame;frame;frame count` line per unique stack) which flamegraph.pl
+    and speedscope read. Unlike cProfile, the overhead doesn't grow with
+    the number of function calls made.
+    """
+
+    def __init__(self, interval=DEFAULT_SAMPLE_INTERVAL):
+        self.interval = interval
+        self.stacks = {}
+        self._stopped = threading.Event()
+        self._thread = None
+
+    @staticmethod
+    def is_available():
+        return hasattr(sys, '_current_frames')
+
+    def _record(self, frame):
+        stack = []
+        while frame is not None:
+            stack.append(_format_frame(frame))
+            frame = frame.f_back
+        key = ';'.join(reversed(stack))
+        self.stacks[key] = self.stacks.get(key, 0) + 1
+
+    def _sample(self):
+        own = threading.current_thread().ident
+        for thread_id, frame in sys._current_frames().items():
+            if thread_id != own:
+                self._record(frame)
+
+    def _run(self):
+        while not self._stopped.wait(self.interval):
+            self._sample()
+
+    def start(self):
+        self._stopped.clear()
+        self._thread = threading.Thread(target=self._run)
+        self._thread.daemon = True
+        self._thread.start()
+
+    def stop(self):
+        self._stopped.set()
+        if self._thread:
+            self._thread.join()
+            self._thread = None
+
+    def dump(self, path):
+        """writes the samples to `path` in the collapsed stack format"""
+        with open(path, 'w') as f:
+            for stack, count in sorted(self.stacks.items()):
+                f.write('{0} {1}\n'.format(stack, count))
+
+
+def profile(func, path, *args, **kwargs):
+    """calls `func` under a profiler and writes the profile to `path`
+
+    If `path` ends with `.collapsed` or `.folded`, the sampler is used and
+    collapsed stacks are written. Otherwise, cProfile is used and pstats
+    are written (see the `pstats` module or snakeviz). The profile is
+    written even if `func` raises or exits.
+
+    :param func: the callable to profile.
+    :param string path: path to write the profile to.
+    :rtype: whatever `func` returns.
+    """
+    if path.endswith(COLLAPSED_EXTENSIONS):
+        if Sampler.is_available():
+            sampler = Sampler()
+            sampler.start()
+            try:
+                return func(*args, **kwargs)
+            finally:
+                sampler.stop()
+                sampler.dump(path)
+                jocker_lgr.info('collapsed stacks ({0} samples) written to '
+                                '{1}', sum(sampler.stacks.values()), path)
+        jocker_lgr.warning('sampling is not available here, writing pstats '
+                           'to {0} instead', path)
+    profiler = cProfile.Profile()
+    try:
+        return profiler.runcall(func, *args, **kwargs)
+    finally:
+        profiler.dump_stats(path)
+        jocker_lgr.info('profile written to {0}', path)
@@ -0,0 +1,220 @@
+from __future__ import absolute_import
+import re
+import time
+import socket
+import threading
+import docker
+from jocker.jocker import jocker_lgr
+from jocker.jocker import _client_pool
+from jocker.jocker import _push_records
+from jocker.jocker import _normalize_image
+from jocker.jocker import _iter_json_events
+from jocker.jocker import _parse_image_name
+from jocker.jocker import DEFAULT_DOCKER_CONFIG
+from jocker.jocker import PUSH_OUTPUT_MARKERS
+from jocker.events import events
+
+DEFAULT_PUSH_WORKERS = 8
+DEFAULT_REGISTRY_CONCURRENCY = 4
+DEFAULT_REGISTRY = 'index.docker.io'
+DIGEST_RE = re.compile(r'digest: (\S+:[0-9a-f]+)')
+
+
+def _get_registry(repository):
+    """returns the registry a repository resides in
+
+    :param string repository: [registry/]repository
+    """
+    parts = repository.split('/', 1)
+    if len(parts) == 1 or not ('.' in parts[0] or ':' in parts[0] or
+                               parts[0] == 'localhost'):
+        return DEFAULT_REGISTRY
+    return parts[0]
+
+
+class Pusher():
+    """pushes many repository:tag targets concurrently
+
+    Pushes are performed by a pool of worker threads. The number of
+    concurrent pushes to any single registry is capped, so that many
+    targets in one registry don't starve or overwhelm it while targets in
+    other registries are pushed alongside. The total push time is then
+    bounded by the slowest push in each registry rather than by the sum of
+    all pushes.
+
+    If the id of the image being pushed is known, each successful push is
+    recorded. With `skip_pushed`, pushing the same image to the same target
+    through the same daemon and as the same registry user again is skipped.
+    The registry isn't consulted, so an image deleted from the registry
+    since won't be pushed again; hence the skip is opt-in.
+    """
+
+    def __init__(self, client=None, workers=DEFAULT_PUSH_WORKERS,
+                 registry_concurrency=DEFAULT_REGISTRY_CONCURRENCY,
+                 image_id=None, skip_pushed=False):
+        """
+        :param client: a callable returning a context manager which
+         provides a docker client. defaults to the process wide pool.
+        :param int workers: maximum number of concurrent pushes.
+        :param int registry_concurrency: maximum number of concurrent
+         pushes to a single registry.
+        :param string image_id: id of the image being pushed.
+        :param bool skip_pushed: skip targets which the image was
+         recorded as pushed to.
+        """
+        self.client = client or (lambda: _client_pool.client(
+            DEFAULT_DOCKER_CONFIG['client']))
+        self.workers = max(1, int(workers))
+        self.registry_concurrency = max(1, int(registry_concurrency))
+        self.image_id = image_id
+        self.skip_pushed = skip_pushed
+        self._semaphores = {}
+        self._lock = threading.Lock()
+
+    def _get_semaphore(self, registry):
+        with self._lock:
+            if registry not in self._semaphores:
+                self._semaphores[registry] = threading.BoundedSemaphore(
+                    self.registry_concurrency)
+            return self._semaphores[registry]
+
+    def _get_record_key(self, c, target):
+        """returns the key a push of the image to `target` is recorded by:
+        the target, the image, the daemon pushing it and the user it
+        authenticates to the registry as.
+        """
+        registry = _get_registry(_parse_image_name(target)[0])
+        auth = docker.auth.resolve_authconfig(
+            getattr(c, '_auth_configs', None) or {},
+            None if registry == DEFAULT_REGISTRY else registry) or {}
+        return '|'.join([_normalize_image(target), self.image_id,
+                         getattr(c, 'base_url', None) or '',
+                         auth.get('username') or ''])
+
+    def _push(self, target):
+        """pushes a single target and returns its result
+
+        :param string target: repository[:tag]
+        :rtype: `dict`
+        """
+        repository, tag = _parse_image_name(target)
+        result = {
+            'target': target,
+            'registry': _get_registry(repository),
+            'status': 'pushed',
+            'error': None,
+            'code': None,
+            'digest': None,
+            'duration': 0,
+        }
+        if '@' in repository:
+            # a digest is what the registry assigns to a pushed manifest,
+            # docker-py would split it into a repository and a tag instead.
+            result['status'], result['code'] = 'failed', 500
+            result['error'] = 'cannot push to a digest reference'
+            events.emit('error', phase='push', target=target,
+                        message=result['error'])
+            return result
+        record_key = None
+        start = time.time()
+        try:
+            with self.client() as c:
+                if self.image_id:
+                    record_key = self._get_record_key(c, target)
+                record = _push_records.get(record_key) \
+                    if record_key and self.skip_pushed else None
+                if record is not None:
+                    result['status'] = 'skipped'
+                    result['digest'] = record or None
+                    return result
+                jocker_lgr.info('pushing {0}', target)
+                for event in _iter_json_events(
+                        c.push(repository, tag=tag, stream=True),
+                        PUSH_OUTPUT_MARKERS):
+                    if 'error' in event:
+                        result['error'] = event['error']
+                        result['code'] = 500
+                        jocker_lgr.error('{0}: {1}', target, event['error'])
+                        continue
+                    jocker_lgr.debug(event)
+                    if events.enabled:
+                        self._emit_progress(target, event)
+                    match = DIGEST_RE.search(event.get('status', ''))
+                    if match:
+                        result['digest'] = match.group(1)
+        except docker.errors.APIError as ex:
+            result['error'], result['code'] = str(ex), 500
+        except socket.timeout as ex:
+            result['error'], result['code'] = str(ex) or 'timed out', 408
+        except Exception as ex:
+            result['error'], result['code'] = str(ex), 500
+        finally:
+            result['duration'] = time.time() - start
+        if result['error']:
+            result['status'] = 'failed'
+            events.emit('error', phase='push', target=target,
+                        message=result['error'])
+        elif record_key:
+            _push_records.set(record_key, result['digest'] or '')
+        return result
+
+    @staticmethod
+    def _emit_progress(target, event):
+        progress = event.get('progressDetail') or {}
+        events.emit('push_progress', target=target, layer=event.get('id'),
+                    status=event.get('status'),
+                    current=progress.get('current'),
+                    total=progress.get('total'))
+
+    def _worker(self, target, results, slots):
+        # the registry's semaphore is acquired before a global slot, so that
+        # pushes waiting on a busy registry never keep pushes to other
+        # registries from starting.
+        registry = _get_registry(_parse_image_name(target)[0])
+        with self._get_semaphore(registry):
+            with slots:
+                result = self._push(target)
+        results[target] = result
+        events.emit('push', target=target, status=result['status'],
+                    digest=result['digest'], duration=result['duration'])
+
+    def push(self, targets):
+        """pushes all targets and reports the outcome of each
+
+        :param list targets: repository[:tag] strings to push.
+        :rtype: `list` of `dict`s describing each push in the order of
+         `targets`.
+        """
+        start = time.time()
+        targets = [t for i, t in enumerate(targets) if t not in targets[:i]]
+        slots = threading.BoundedSemaphore(self.workers)
+        results = {}
+        threads = [threading.Thread(target=self._worker,
+                                    args=(target, results, slots))
+                   for target in targets]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+        report = [results[target] for target in targets]
+        self.log_report(report, time.time() - start)
+        return report
+
+    def log_report(self, report, duration):
+        """logs the outcome of each push and a summary of them all"""
+        for result in report:
+            if result['error']:
+                jocker_lgr.error('failed to push {0} ({1})', result['target'],
+                                 result['error'])
+            elif result['status'] == 'skipped':
+                jocker_lgr.info('skipped {0}, image {1} already pushed',
+                                result['target'], self.image_id)
+            else:
+                jocker_lgr.info('pushed {0} in {1:.1f}s{2}', result['target'],
+                                result['duration'],
+                                ' ({0})'.format(result['digest'])
+                                if result['digest'] else '')
+        jocker_lgr.info('{0}/{1} targets pushed in {2:.1f}s',
+                        len([r for r in report if not r['error']]),
+                        len(report), duration)
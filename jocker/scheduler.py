@@ -0,0 +1,186 @@
+from __future__ import absolute_import
+import re
+import time
+import threading
+try:
+    import queue
+except ImportError:
+    import Queue as queue
+from jocker.jocker import jocker_lgr
+from jocker.jocker import JockerError
+from jocker.jocker import _normalize_image
+
+DEFAULT_BUILD_WORKERS = 4
+FROM_RE = re.compile(r'^\s*FROM\s+(\S+)', re.IGNORECASE | re.MULTILINE)
+
+
+def _parse_parents(dockerfile):
+    """returns the images the `FROM` lines of a Dockerfile refer to
+
+    :param string dockerfile: path to Dockerfile
+    """
+    with open(dockerfile, 'r') as f:
+        return [_normalize_image(i) for i in FROM_RE.findall(f.read())]
+
+
+class Scheduler():
+    """builds a family of images, parents before children, concurrently
+
+    The images' dependencies are inferred from the `FROM` lines of their
+    (already generated) Dockerfiles: an image whose `FROM` refers to another
+    image in the family is only built once its parent is built. Any other
+    image is built as soon as a worker is free. If a build fails, the
+    images depending on it are skipped.
+    """
+
+    def __init__(self, jockers, workers=DEFAULT_BUILD_WORKERS):
+        """
+        :param list jockers: `Jocker` objects, each with an image to build.
+        :param int workers: number of images to build concurrently.
+        """
+        self.workers = max(1, int(workers))
+        self.nodes = {}
+        for j in jockers:
+            image = _normalize_image(j.build or j.push)
+            if image in self.nodes:
+                raise JockerError('{0} is built more than once'.format(image))
+            self.nodes[image] = {
+                'jocker': j,
+                'parents': [],
+                'children': [],
+                'status': 'pending',
+                'start': None,
+                'end': None,
+                'error': None,
+            }
+        for image, node in self.nodes.items():
+            for parent in _parse_parents(node['jocker'].outputfile):
+                if parent in self.nodes and parent not in node['parents']:
+                    node['parents'].append(parent)
+                    self.nodes[parent]['children'].append(image)
+        self.order = self._sort()
+        self._lock = threading.Lock()
+        self._ready = queue.Queue()
+        self._remaining = 0
+
+    def _sort(self):
+        """returns the images in topological order"""
+        pending = dict((image, len(node['parents']))
+                       for image, node in self.nodes.items())
+        ready = sorted(image for image, count in pending.items() if not count)
+        order = []
+        while ready:
+            image = ready.pop(0)
+            order.append(image)
+            for child in self.nodes[image]['children']:
+                pending[child] -= 1
+                if not pending[child]:
+                    ready.append(child)
+        if len(order) != len(self.nodes):
+            raise JockerError('circular dependency between: {0}'.format(
+                ', '.join(sorted(set(self.nodes) - set(order)))))
+        return order
+
+    def _build(self, image):
+        """builds an image and returns its status and error, if any"""
+        node = self.nodes[image]
+        node['start'] = time.time()
+        try:
+            node['jocker'].build_image()
+        except (Exception, SystemExit) as ex:
+            return 'failed', str(ex) or type(ex).__name__
+        finally:
+            node['end'] = time.time()
+        return 'built', None
+
+    def _skip(self, image, reason):
+        node = self.nodes[image]
+        if node['status'] != 'pending':
+            return
+        node['status'] = 'skipped'
+        node['error'] = reason
+        self._remaining -= 1
+        for child in node['children']:
+            self._skip(child, 'parent {0} failed'.format(image))
+
+    def _worker(self):
+        while True:
+            image = self._ready.get()
+            if image is None:
+                return
+            status, error = self._build(image)
+            with self._lock:
+                self._remaining -= 1
+                node = self.nodes[image]
+                node['status'], node['error'] = status, error
+                for child in node['children']:
+                    if status != 'built':
+                        self._skip(child, 'parent {0} failed'.format(image))
+                    elif all(self.nodes[p]['status'] == 'built'
+                             for p in self.nodes[child]['parents']):
+                        self.nodes[child]['status'] = 'queued'
+                        self._ready.put(child)
+                if not self._remaining:
+                    for _ in range(self.workers):
+                        self._ready.put(None)
+
+    def critical_path(self):
+        """returns the chain of builds which took the longest and its
+        duration in seconds.
+        """
+        finish = {}
+        previous = {}
+        for image in self.order:
+            node = self.nodes[image]
+            duration = (node['end'] - node['start']) if node['end'] else 0
+            parents = [p for p in node['parents'] if p in finish]
+            parent = max(parents, key=finish.get) if parents else None
+            finish[image] = duration + (finish[parent] if parent else 0)
+            previous[image] = parent
+        if not finish:
+            return [], 0
+        image = max(finish, key=finish.get)
+        total = finish[image]
+        path = []
+        while image:
+            path.insert(0, image)
+            image = previous[image]
+        return path, total
+
+    def run(self):
+        """builds all images and reports the outcome
+
+        :rtype: `dict` of images and their build status.
+        """
+        start = time.time()
+        jocker_lgr.info('building {0} images using {1} workers',
+                        len(self.nodes), self.workers)
+        self._remaining = len(self.nodes)
+        if not self._remaining:
+            return {}
+        for image in self.order:
+            if not self.nodes[image]['parents']:
+                self.nodes[image]['status'] = 'queued'
+                self._ready.put(image)
+        threads = [threading.Thread(target=self._worker)
+                   for _ in range(min(self.workers, len(self.nodes)))]
+        for thread in threads:
+            thread.daemon = True
+            thread.start()
+        for thread in threads:
+            thread.join()
+
+        for image in self.order:
+            node = self.nodes[image]
+            if node['status'] == 'built':
+                jocker_lgr.info('built {0} in {1:.1f}s', image,
+                                node['end'] - node['start'])
+            else:
+                jocker_lgr.error('{0} {1} ({2})', image, node['status'],
+                                 node['error'])
+        path, duration = self.critical_path()
+        jocker_lgr.info('critical path: {0} ({1:.1f}s)', ' -> '.join(path),
+                        duration)
+        jocker_lgr.info('total build time: {0:.1f}s', time.time() - start)
+        return dict((image, node['status'])
+                    for image, node in self.nodes.items())
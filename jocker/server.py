@@ -0,0 +1,280 @@
+"""Serves render, build and push requests from a long running process
+
+`jocker serve` accepts requests over http, on a unix socket or a local
+port, so that the interpreter's startup, `logger.init` and the
+compilation of templates are paid for once rather than on every run.
+Compiled templates (see `_get_environment`), parsed varsfiles and docker
+configs (see `_import_vars` and `_import_config`) and docker clients (see
+`_ClientPool`) are kept warm across requests.
+
+Each request is a POST of a json object to `/render`, `/build` or `/push`:
+
+    {"templatefile": "/path/to/Dockerfile.template",
+     "varsfile": "/path/to/vars.py",
+     "outputfile": "/path/to/Dockerfile",
+     "build": "nir0s/woo:1.0"}
+
+`vars` (a mapping) may be supplied instead of `varsfile`. `dockerconfig`,
+`skip_unchanged` and (for `/render`) `dryrun` are supported as well, and
+`/push` expects `push` rather than `build` (and supports `skip_pushed`).
+Paths are resolved by the server, so they'd better be absolute.
+
+As a request may render any file the server can read and push images on
+its behalf, it's only served to those who may:
+
+- By default, the server listens on a unix socket (`DEFAULT_SOCKET`)
+  which only its user may connect to.
+- Serving on a port requires a token, which each request must supply as
+  `Authorization: Bearer <token>` (a token may be required on a unix
+  socket as well).
+- Requests must have a `Content-Type` of `application/json`. Browsers
+  don't send cross origin requests of that type without asking first,
+  so a web page can't post to a server on localhost.
+"""
+
+from __future__ import absolute_import
+import os
+import sys
+import hmac
+import json
+import stat
+import time
+import threading
+try:
+    import queue
+    import socketserver
+    from http.server import BaseHTTPRequestHandler
+except ImportError:
+    import Queue as queue
+    import SocketServer as socketserver
+    from BaseHTTPServer import BaseHTTPRequestHandler
+from jocker.jocker import jocker_lgr
+from jocker.jocker import Jocker
+from jocker.jocker import JockerError
+
+DEFAULT_SOCKET = os.path.expanduser('~/.jocker/jocker.sock')
+DEFAULT_HOST = '127.0.0.1'
+DEFAULT_PORT = 8642
+TOKEN_ENV_VAR = 'JOCKER_SERVE_TOKEN'
+# requests accepted but not yet picked up by a worker, per worker.
+PENDING_REQUESTS_PER_WORKER = 4
+ACTIONS = ('render', 'build', 'push')
+
+
+def handle(action, params):
+    """renders, builds or pushes as requested and returns the outcome
+
+    :param string action: one of `ACTIONS`.
+    :param dict params: the request (see the module's docstring).
+    :rtype: `dict` stating the rendered `content` if dryrun, otherwise the
+     `outputfile`, whether it `changed`, the built `image` and the
+     `pushed` targets' report (see `Jocker.run`).
+    """
+    if action not in ACTIONS:
+        raise JockerError('unknown action: {0}'.format(action))
+    if not params.get('templatefile'):
+        raise JockerError('templatefile is required')
+    # checked here, as Jocker exits when the template is missing.
+    if not os.path.isfile(params['templatefile']):
+        raise JockerError('template file missing: {0}'.format(
+            params['templatefile']))
+    if not params.get('varsfile') and params.get('vars') is None:
+        raise JockerError('either varsfile or vars is required')
+    if not isinstance(params.get('vars', {}), dict):
+        raise JockerError('vars must be a mapping')
+    dryrun = action == 'render' and bool(params.get('dryrun'))
+    if not dryrun and not params.get('outputfile'):
+        raise JockerError('outputfile is required unless dryrun')
+    build = params.get('build') if action != 'render' else False
+    push = params.get('push') if action == 'push' else False
+    if action == 'build' and not build:
+        raise JockerError('build is required')
+    if action == 'push' and not push:
+        raise JockerError('push is required')
+
+    j = Jocker(params.get('varsfile'), params['templatefile'],
+               params.get('outputfile'), params.get('dockerconfig'),
+               dryrun, build, push, params.get('skip_unchanged'),
+               variables=params.get('vars'))
+    outcome = j.run(bool(params.get('skip_pushed')))
+    return {'content': outcome} if dryrun else outcome
+
+
+def _compare_tokens(a, b):
+    """compares tokens in constant time (where python allows it)"""
+    if hasattr(hmac, 'compare_digest'):
+        return hmac.compare_digest(a, b)
+    if len(a) != len(b):
+        return False
+    return sum(ord(x) ^ ord(y) for x, y in zip(a, b)) == 0
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    def log_message(self, format, *args):
+        jocker_lgr.debug(format % args)
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _authorized(self):
+        if not self.server.token:
+            return True
+        scheme, _, token = (self.headers.get('Authorization') or '') \
+            .partition(' ')
+        return scheme.lower() == 'bearer' and \
+            _compare_tokens(token.strip(), self.server.token)
+
+    def do_POST(self):
+        start = time.time()
+        action = self.path.strip('/')
+        if not self._authorized():
+            return self._send_json(401, {'error': 'unauthorized'})
+        content_type = (self.headers.get('Content-Type') or '') \
+            .split(';')[0].strip().lower()
+        if content_type != 'application/json':
+            return self._send_json(415, {
+                'error': 'Content-Type must be application/json'})
+        try:
+            length = int(self.headers.get('Content-Length') or 0)
+            params = json.loads(self.rfile.read(length).decode('utf-8') or
+                                '{}')
+            if not isinstance(params, dict):
+                raise ValueError('a json object is expected')
+        except ValueError as ex:
+            return self._send_json(400, {'error': 'bad request ({0})'.format(
+                ex)})
+        try:
+            status, body = 200, handle(action, params)
+        except JockerError as ex:
+            status, body = 400, {'error': str(ex)}
+        except SystemExit as ex:
+            # jocker exits with a code stating why a run failed.
+            status, body = 500, {'error': 'failed', 'code': ex.code}
+        except Exception as ex:
+            jocker_lgr.exception('failed to handle {0}', self.path)
+            status, body = 500, {'error': str(ex)}
+        self._send_json(status, body)
+        jocker_lgr.info('{0} {1} ({2:.0f}ms)', self.path, status,
+                        (time.time() - start) * 1000)
+
+    def do_GET(self):
+        if not self._authorized():
+            return self._send_json(401, {'error': 'unauthorized'})
+        if self.path == '/status':
+            return self._send_json(200, {'workers': self.server.workers})
+        self._send_json(404, {'error': 'not found'})
+
+
+class _PooledMixIn():
+    """handles requests using a bounded pool of worker threads
+
+    Once all workers are busy and the pending requests queue is full,
+    new connections wait in the listen backlog.
+    """
+
+    def start_workers(self, workers):
+        self.workers = workers
+        self._requests = queue.Queue(workers * PENDING_REQUESTS_PER_WORKER)
+        for _ in range(workers):
+            thread = threading.Thread(target=self._work)
+            thread.daemon = True
+            thread.start()
+
+    def _work(self):
+        while True:
+            request, client_address = self._requests.get()
+            try:
+                self.finish_request(request, client_address)
+            except Exception:
+                self.handle_error(request, client_address)
+            finally:
+                self.shutdown_request(request)
+
+    def process_request(self, request, client_address):
+        self._requests.put((request, client_address))
+
+
+class _TCPServer(_PooledMixIn, socketserver.TCPServer):
+
+    allow_reuse_address = True
+
+
+class _UnixServer(_PooledMixIn, socketserver.UnixStreamServer):
+
+    def get_request(self):
+        # unix sockets have no address, which the http handler expects.
+        request, _ = socketserver.UnixStreamServer.get_request(self)
+        return request, ('unix', 0)
+
+
+def create_server(socket_path=None, host=DEFAULT_HOST, port=None,
+                  workers=None, token=None):
+    """returns a server listening on `host`:`port` if a port is supplied,
+    otherwise on the unix socket at `socket_path` (`DEFAULT_SOCKET` by
+    default). call `serve_forever` on it to start serving.
+
+    :param string socket_path: path to a unix socket to listen on.
+    :param string host: address to listen on.
+    :param int port: port to listen on (0 picks a free one).
+    :param int workers: number of requests to handle concurrently
+     (defaults to the number of CPUs).
+    :param string token: token requests must supply. required when
+     listening on a port.
+    """
+    import multiprocessing
+    if port is not None:
+        if not token:
+            raise JockerError('a token is required to serve on a port '
+                              '(supply --token or {0})'.format(TOKEN_ENV_VAR))
+        server = _TCPServer((host, int(port)), _Handler)
+    else:
+        socket_path = socket_path or DEFAULT_SOCKET
+        if not os.path.isdir(os.path.dirname(socket_path)):
+            os.makedirs(os.path.dirname(socket_path))
+        # a socket left behind by a previous server is replaced.
+        if os.path.exists(socket_path) and \
+                stat.S_ISSOCK(os.stat(socket_path).st_mode):
+            os.remove(socket_path)
+        server = _UnixServer(socket_path, _Handler)
+        # only the user serving may connect.
+        os.chmod(socket_path, 0o600)
+    server.token = token
+    server.start_workers(int(workers or multiprocessing.cpu_count()))
+    return server
+
+
+def serve(socket_path=None, host=None, port=None, workers=None, token=None):
+    """serves requests until interrupted (see `create_server`)
+
+    Unless a `port` or a `host` is supplied, requests are served on a unix
+    socket. The token defaults to the `JOCKER_SERVE_TOKEN` env var.
+    """
+    if host and not port:
+        port = DEFAULT_PORT
+    if port is not None:
+        socket_path = None
+    elif not socket_path:
+        socket_path = DEFAULT_SOCKET
+    try:
+        server = create_server(socket_path, host or DEFAULT_HOST, port,
+                               workers, token or os.environ.get(TOKEN_ENV_VAR))
+    except JockerError as ex:
+        jocker_lgr.error(str(ex))
+        sys.exit(100)
+    jocker_lgr.info('serving on {0} using {1} workers',
+                    socket_path or '{0}:{1}'.format(*server.server_address),
+                    server.workers)
+    try:
+        server.serve_forever()
+    except KeyboardInterrupt:
+        jocker_lgr.info('stopping...')
+    finally:
+        server.server_close()
+        if socket_path and os.path.exists(socket_path):
+            os.remove(socket_path)
@@ -1 +1,28 @@
 __author__ = 'nir0s'
+
+import os
+import shutil
+import tempfile
+
+import testtools
+
+import jocker.jocker
+import jocker.pusher
+import jocker.context
+
+
+class IsolatedTestCase(testtools.TestCase):
+    """a test case whose build cache, push records and build contexts are
+    kept in a temporary dir (`cache_dir`) rather than in ~/.jocker
+    """
+
+    def setUp(self):
+        super(IsolatedTestCase, self).setUp()
+        self.cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.cache_dir)
+        self.patch(jocker.jocker, '_build_cache', jocker.jocker._RecordCache(
+            os.path.join(self.cache_dir, 'builds.json')))
+        self.patch(jocker.pusher, '_push_records', jocker.jocker._RecordCache(
+            os.path.join(self.cache_dir, 'pushes.json')))
+        self.patch(jocker.context, 'DEFAULT_CONTEXT_CACHE_DIR',
+                   os.path.join(self.cache_dir, 'contexts'))
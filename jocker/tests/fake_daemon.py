@@ -0,0 +1,317 @@
+"""A fake docker daemon for testing and benchmarking builds and pushes
+
+`FakeDaemon` serves the subset of the docker remote api which jocker uses
+(build, tag, inspect and push) over a unix socket, so `build_image` and
+`push_image` can be exercised end to end without a docker daemon or a
+registry:
+
+    with FakeDaemon(push_layers=4, events_per_chunk=10) as daemon:
+        j.client_config = daemon.client_config
+        j.build_image()
+        j.push_image()
+
+Builds and pushes are replayed as streams of json events, the way the
+daemon streams them, which can be shaped by:
+
+- `build_steps`, `push_layers` and `progress_events`: the length of the
+  streams.
+- `events_per_chunk`: the number of json objects concatenated into a single
+  line (i.e. http chunk). docker-py reads a single line per chunk, so a
+  chunk always ends with a newline, as it does with the real daemon.
+- `build_error` and `push_error`: an error event to end the stream with.
+- `delay`: seconds to wait before each chunk, i.e. a slow producer.
+"""
+
+import io
+import os
+import re
+import json
+import time
+import shutil
+import tarfile
+import hashlib
+import tempfile
+import threading
+try:
+    import socketserver
+    from http.server import BaseHTTPRequestHandler
+    from urllib.parse import urlparse, parse_qs
+except ImportError:
+    import SocketServer as socketserver
+    from BaseHTTPServer import BaseHTTPRequestHandler
+    from urlparse import urlparse, parse_qs
+
+# docker-py reads streamed responses from the raw socket, bypassing the
+# buffer httplib reads the headers through. the body is only sent once the
+# client had time to read the headers (as is the case with the real daemon,
+# which takes a while to start building or pushing) so that none of it ends
+# up in that buffer.
+HEADERS_DELAY = 0.02
+API_PATH_RE = re.compile(r'^/v[0-9.]+(/.*)$')
+IMAGE_PATH_RE = re.compile(r'^/images/(.+)/(json|tag|push)$')
+
+
+def _normalize(name, tag=None):
+    if tag:
+        return '{0}:{1}'.format(name, tag)
+    if ':' in name.rsplit('/', 1)[-1]:
+        return name
+    return '{0}:latest'.format(name)
+
+
+def _read_dockerfile(context):
+    """returns the content of the Dockerfile in a context tarball"""
+    try:
+        tar = tarfile.open(fileobj=io.BytesIO(context or b''))
+        try:
+            return tar.extractfile('Dockerfile').read()
+        finally:
+            tar.close()
+    except (tarfile.TarError, KeyError, AttributeError):
+        return None
+
+
+class _Handler(BaseHTTPRequestHandler):
+
+    protocol_version = 'HTTP/1.1'
+
+    def log_message(self, format, *args):
+        pass
+
+    def _read_body(self):
+        if self.headers.get('Transfer-Encoding', '') == 'chunked':
+            body = []
+            while True:
+                size = int(self.rfile.readline().strip() or '0', 16)
+                if not size:
+                    self.rfile.readline()
+                    break
+                body.append(self.rfile.read(size))
+                self.rfile.readline()
+            return b''.join(body)
+        return self.rfile.read(int(self.headers.get('Content-Length') or 0))
+
+    def _send_json(self, status, body):
+        data = json.dumps(body).encode('utf-8')
+        self.send_response(status)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Content-Length', str(len(data)))
+        self.end_headers()
+        self.wfile.write(data)
+
+    def _send_stream(self, events):
+        daemon = self.server.daemon
+        self.send_response(200)
+        self.send_header('Content-Type', 'application/json')
+        self.send_header('Transfer-Encoding', 'chunked')
+        self.end_headers()
+        self.wfile.flush()
+        time.sleep(HEADERS_DELAY)
+        for i in range(0, len(events), daemon.events_per_chunk):
+            if daemon.delay:
+                time.sleep(daemon.delay)
+            data = ''.join(json.dumps(e) for e in events[
+                i:i + daemon.events_per_chunk]) + '\r\n'
+            data = data.encode('utf-8')
+            self.wfile.write('{0:x}\r\n'.format(len(data)).encode('utf-8'))
+            self.wfile.write(data + b'\r\n')
+            self.wfile.flush()
+        self.wfile.write(b'0\r\n\r\n')
+        self.wfile.flush()
+
+    def _route(self, method):
+        url = urlparse(self.path)
+        params = dict((k, v[0]) for k, v in parse_qs(url.query).items())
+        match = API_PATH_RE.match(url.path)
+        path = match.group(1) if match else url.path
+        daemon = self.server.daemon
+        with daemon.lock:
+            daemon.requests.append((method, path))
+        body = self._read_body() if method == 'POST' else None
+        if method == 'POST' and path == '/build':
+            return self._send_stream(daemon.build(body, params))
+        match = IMAGE_PATH_RE.match(path)
+        if not match:
+            return self._send_json(404, {'message': 'page not found'})
+        name, action = match.groups()
+        if method == 'GET' and action == 'json':
+            image = daemon.find_image(name)
+            if image is None:
+                return self._send_json(
+                    404, {'message': 'No such image: {0}'.format(name)})
+            return self._send_json(200, image)
+        if method == 'POST' and action == 'tag':
+            if not daemon.tag(name, params.get('repo'), params.get('tag')):
+                return self._send_json(
+                    404, {'message': 'No such image: {0}'.format(name)})
+            return self._send_json(201, {})
+        if method == 'POST' and action == 'push':
+            return self._send_stream(daemon.push(name, params.get('tag')))
+        return self._send_json(404, {'message': 'page not found'})
+
+    def do_GET(self):
+        self._route('GET')
+
+    def do_POST(self):
+        self._route('POST')
+
+
+class _Server(socketserver.ThreadingMixIn, socketserver.UnixStreamServer):
+
+    daemon_threads = True
+
+    def get_request(self):
+        # unix sockets have no address, which the http handler expects.
+        request, _ = socketserver.UnixStreamServer.get_request(self)
+        return request, ('fake-daemon', 0)
+
+
+class FakeDaemon():
+    """a fake docker daemon listening on a unix socket"""
+
+    def __init__(self, socket_path=None, build_steps=3, push_layers=3,
+                 progress_events=5, events_per_chunk=1, build_error=None,
+                 push_error=None, delay=0):
+        self._tmp_dir = None
+        if socket_path is None:
+            self._tmp_dir = tempfile.mkdtemp()
+            socket_path = os.path.join(self._tmp_dir, 'docker.sock')
+        self.socket_path = socket_path
+        self.build_steps = build_steps
+        self.push_layers = push_layers
+        self.progress_events = progress_events
+        self.events_per_chunk = max(1, int(events_per_chunk))
+        self.build_error = build_error
+        self.push_error = push_error
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.requests = []
+        self.contexts = []
+        self.dockerfiles = []
+        self.pushes = []
+        self.images = {}
+        self.tags = {}
+        self._server = None
+
+    @property
+    def client_config(self):
+        """returns a docker-py client configuration for this daemon"""
+        return {'base_url': 'unix://{0}'.format(self.socket_path),
+                'version': '1.14', 'timeout': 10}
+
+    def find_image(self, name):
+        """returns the inspect output of an image by name or id (prefix)"""
+        with self.lock:
+            image_id = self.tags.get(_normalize(name))
+            if image_id is None:
+                matches = [i for i in self.images if i.startswith(name)]
+                image_id = matches[0] if len(matches) == 1 else None
+            return self.images.get(image_id)
+
+    def tag(self, name, repository, tag=None):
+        image = self.find_image(name)
+        if image is None:
+            return False
+        with self.lock:
+            self.tags[_normalize(repository, tag)] = image['Id']
+        return True
+
+    def build(self, context, params):
+        """records a build and returns the events streamed back"""
+        dockerfile = _read_dockerfile(context)
+        with self.lock:
+            self.contexts.append(len(context or b''))
+            self.dockerfiles.append(dockerfile)
+        if dockerfile is None:
+            # as the daemon does, the context's Dockerfile is built.
+            error = 'Cannot locate specified Dockerfile: Dockerfile'
+            return [{'errorDetail': {'message': error}, 'error': error}]
+        image_id = hashlib.sha256(context or b'').hexdigest()
+        events = []
+        for step in range(self.build_steps):
+            events.append({'stream': 'Step {0} : RUN echo {0}\n'.format(
+                step)})
+            events.append({'stream': ' ---> {0}\n'.format(
+                hashlib.sha256(str(step).encode('utf-8')).hexdigest()[:12])})
+        if self.build_error:
+            events.append({'errorDetail': {'message': self.build_error},
+                           'error': self.build_error})
+            return events
+        events.append({'stream': 'Successfully built {0}\n'.format(
+            image_id[:12])})
+        with self.lock:
+            self.images[image_id] = {
+                'Id': image_id,
+                'Size': len(context or b''),
+                'RootFS': {'Layers': [
+                    'sha256:' + hashlib.sha256(
+                        '{0}{1}'.format(image_id, i).encode('utf-8'))
+                    .hexdigest() for i in range(self.push_layers)]},
+                'RepoDigests': [],
+            }
+            if params.get('t'):
+                self.tags[_normalize(params['t'])] = image_id
+        return events
+
+    def push(self, repository, tag=None):
+        """records a push and returns the events streamed back"""
+        target = _normalize(repository, tag)
+        with self.lock:
+            self.pushes.append(target)
+            image = self.images.get(self.tags.get(target))
+        events = [{'status': 'The push refers to a repository [{0}] '
+                             '(len: 1)'.format(repository)}]
+        if image is None:
+            error = 'Repository does not exist: {0}'.format(target)
+            return events + [{'errorDetail': {'message': error},
+                              'error': error}]
+        events.append({'status': 'Sending image list'})
+        total = 1024 * 1024
+        for layer in image['RootFS']['Layers']:
+            layer_id = layer[7:19]
+            for i in range(1, self.progress_events + 1):
+                current = total * i // self.progress_events
+                events.append({
+                    'status': 'Pushing',
+                    'progressDetail': {'current': current, 'total': total},
+                    'progress': '[{0:<50}] {1} B/{2} B'.format(
+                        '=' * (50 * i // self.progress_events),
+                        current, total),
+                    'id': layer_id})
+            events.append({'status': 'Image successfully pushed',
+                           'id': layer_id})
+            if self.push_error:
+                return events + [{'errorDetail': {'message': self.push_error},
+                                  'error': self.push_error}]
+        digest = 'sha256:' + hashlib.sha256(
+            '{0}{1}'.format(target, image['Id']).encode('utf-8')).hexdigest()
+        with self.lock:
+            image['RepoDigests'].append('{0}@{1}'.format(repository, digest))
+        events.append({'status': '{0}: digest: {1} size: {2}'.format(
+            tag or 'latest', digest, total)})
+        return events
+
+    def start(self):
+        self._server = _Server(self.socket_path, _Handler)
+        self._server.daemon = self
+        thread = threading.Thread(target=self._server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        return self
+
+    def stop(self):
+        if self._server:
+            self._server.shutdown()
+            self._server.server_close()
+            self._server = None
+        if os.path.exists(self.socket_path):
+            os.remove(self.socket_path)
+        if self._tmp_dir:
+            shutil.rmtree(self._tmp_dir, ignore_errors=True)
+
+    def __enter__(self):
+        return self.start()
+
+    def __exit__(self, *args):
+        self.stop()
@@ -0,0 +1,17 @@
+# flake8: NOQA
+
+VARS = {
+    "maintainer": {
+        "name": "nir0s",
+        "email": "nir36g@gmail.com"
+    },
+    "image": {
+        "repository": "ubuntu",
+        "tag": "14.04"
+    },
+    "dependencies": [
+        "git",
+        "make",
+        "curl"
+    ]
+}
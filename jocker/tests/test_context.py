@@ -0,0 +1,159 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.context import build_context
+from jocker.context import get_manifest
+from jocker.context import _is_excluded
+from jocker.context import _compile_pattern
+
+import testtools
+import os
+import shutil
+import tarfile
+import tempfile
+
+DOCKERIGNORE = """# artifacts
+**/*.log
+build
+!build/keep
+"""
+
+
+class TestContext(testtools.TestCase):
+
+    def setUp(self):
+        super(TestContext, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.context_dir = os.path.join(self.tmp_dir, 'context')
+        self.cache_dir = os.path.join(self.tmp_dir, 'cache')
+        os.makedirs(os.path.join(self.context_dir, 'build'))
+        os.makedirs(os.path.join(self.context_dir, 'src'))
+        self._write('.dockerignore', DOCKERIGNORE)
+        self._write('Dockerfile', 'FROM ubuntu:14.04\n')
+        self._write('src/app.py', 'print("hi")\n')
+        self._write('src/debug.log', 'x' * 1024)
+        self._write('build/artifact.bin', 'x' * 1024)
+        self._write('build/keep', 'keep me')
+
+    def _write(self, relpath, content):
+        with open(os.path.join(self.context_dir, relpath), 'w') as f:
+            f.write(content)
+
+    def test_is_excluded(self):
+        patterns = ['*.log', 'build', '!build/keep']
+        self.assertTrue(_is_excluded('debug.log', patterns))
+        self.assertTrue(_is_excluded('build/artifact.bin', patterns))
+        self.assertFalse(_is_excluded('build/keep', patterns))
+        self.assertFalse(_is_excluded('src/app.py', patterns))
+        # as in docker, `*` doesn't match across directories
+        self.assertFalse(_is_excluded('src/debug.log', patterns))
+        self.assertTrue(_is_excluded('src/debug.log', ['**/*.log']))
+        self.assertTrue(_is_excluded('debug.log', ['**/*.log']))
+        self.assertTrue(_is_excluded('src/a/b.pyc', ['src/*']))
+        self.assertFalse(_is_excluded('lib/src/a.pyc', ['src/*']))
+        self.assertTrue(_is_excluded('build/a', ['/build/']))
+
+    def test_compile_pattern(self):
+        self.assertTrue(_compile_pattern('a?c').match('abc'))
+        self.assertFalse(_compile_pattern('a?c').match('a/c'))
+        self.assertTrue(_compile_pattern('[a-c].txt').match('b.txt'))
+        self.assertFalse(_compile_pattern('[!a-c].txt').match('b.txt'))
+        self.assertTrue(_compile_pattern('a/**/z').match('a/b/c/z'))
+        self.assertTrue(_compile_pattern('a/**/z').match('a/z'))
+        self.assertTrue(_compile_pattern('\\*').match('*'))
+        self.assertFalse(_compile_pattern('\\*').match('a'))
+
+    def test_manifest(self):
+        manifest = get_manifest(self.context_dir, workers=2)
+        paths = [entry[0] for entry in manifest]
+        self.assertEquals(paths, [
+            '.dockerignore', 'Dockerfile', 'build/keep', 'src', 'src/app.py'])
+        for entry in manifest:
+            if entry[0] == 'src':
+                self.assertEquals(entry[3], '')
+            else:
+                self.assertEquals(len(entry[3]), 40)
+
+    def test_build_context_cache(self):
+        tar_file, digest = build_context(
+            self.context_dir, cache_dir=self.cache_dir)
+        tar = tarfile.open(tar_file)
+        self.assertIn('build/keep', tar.getnames())
+        self.assertNotIn('build/artifact.bin', tar.getnames())
+        tar.close()
+        os.utime(tar_file, (0, 0))
+
+        self.assertEquals(build_context(
+            self.context_dir, cache_dir=self.cache_dir), (tar_file, digest))
+        self.assertEquals(os.path.getmtime(tar_file), 0)
+
+        # ignored files don't affect the context
+        self._write('build/artifact.bin', 'y' * 2048)
+        self._write('src/new.log', 'y' * 2048)
+        self.assertEquals(build_context(
+            self.context_dir, cache_dir=self.cache_dir), (tar_file, digest))
+
+        self._write('src/app.py', 'print("bye")\n')
+        new_tar_file, new_digest = build_context(
+            self.context_dir, cache_dir=self.cache_dir)
+        self.assertNotEquals(new_digest, digest)
+        self.assertNotEquals(os.path.getmtime(tar_file), 0)
+
+    def test_build_context_dockerfile(self):
+        self._write('Dockerfile.woo', 'FROM ubuntu:14.10\n')
+        dockerfile = os.path.join(self.context_dir, 'Dockerfile.woo')
+        tar_file, digest = build_context(
+            self.context_dir, cache_dir=self.cache_dir, dockerfile=dockerfile)
+        tar = tarfile.open(tar_file)
+        self.assertEquals(tar.extractfile('Dockerfile').read(),
+                          'FROM ubuntu:14.10\n')
+        tar.close()
+        self.assertEquals(build_context(
+            self.context_dir, cache_dir=self.cache_dir, dockerfile=dockerfile),
+            (tar_file, digest))
+        self.assertNotEquals(build_context(
+            self.context_dir, cache_dir=self.cache_dir)[0], tar_file)
+
+        self._write('Dockerfile.woo', 'FROM ubuntu:15.04\n')
+        self.assertNotEquals(build_context(
+            self.context_dir, cache_dir=self.cache_dir,
+            dockerfile=dockerfile)[1], digest)
+
+    def test_build_context_eviction(self):
+        other_dir = os.path.join(self.tmp_dir, 'other')
+        os.makedirs(other_dir)
+        with open(os.path.join(other_dir, 'Dockerfile'), 'w') as f:
+            f.write('FROM ubuntu:14.04\n')
+        tar_file, _ = build_context(
+            self.context_dir, cache_dir=self.cache_dir)
+        manifest_file = os.path.splitext(tar_file)[0] + '.json'
+        os.utime(manifest_file, (0, 0))
+        # the most recently created context is kept even if it's too large
+        other_tar_file, _ = build_context(
+            other_dir, cache_dir=self.cache_dir, max_size=1)
+        self.assertFalse(os.path.exists(tar_file))
+        self.assertFalse(os.path.exists(manifest_file))
+        self.assertTrue(os.path.isfile(other_tar_file))
+
+    def test_build_context_reuse_marks_use(self):
+        tar_file, _ = build_context(
+            self.context_dir, cache_dir=self.cache_dir)
+        manifest_file = os.path.splitext(tar_file)[0] + '.json'
+        os.utime(manifest_file, (0, 0))
+        build_context(self.context_dir, cache_dir=self.cache_dir)
+        self.assertNotEquals(os.path.getmtime(manifest_file), 0)
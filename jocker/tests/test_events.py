@@ -0,0 +1,120 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.events import Events
+from jocker.events import events
+from jocker.tests.fake_daemon import FakeDaemon
+from jocker.jocker import Jocker
+from jocker.jocker import _set_global_verbosity_level
+from jocker import cli
+from jocker.tests import IsolatedTestCase
+
+import os
+import json
+import shutil
+import tempfile
+from StringIO import StringIO
+
+TEST_RESOURCES_DIR = 'jocker/tests/resources'
+MOCK_VARS_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_varsfile.py')
+MOCK_DOCKER_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_dockerfile')
+
+
+class TestEvents(IsolatedTestCase):
+
+    def setUp(self):
+        super(TestEvents, self).setUp()
+        _set_global_verbosity_level(is_verbose_output=False)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.stream = StringIO()
+        events.enable(self.stream)
+        self.addCleanup(events.disable)
+
+    def _events(self):
+        return [json.loads(line) for line in
+                self.stream.getvalue().splitlines()]
+
+    def test_disabled(self):
+        stream = StringIO()
+        e = Events()
+        e.emit('render')
+        e.enable(stream)
+        e.disable()
+        e.emit('render')
+        self.assertEquals(stream.getvalue(), '')
+
+    def test_emit(self):
+        e = Events()
+        stream = StringIO()
+        e.enable(stream)
+        e.emit('push', target='nir0s/woo:1.0', digest=None)
+        e.emit('render', changed=True)
+        lines = stream.getvalue().splitlines()
+        self.assertEquals(len(lines), 2)
+        event = json.loads(lines[0])
+        self.assertEquals(event['event'], 'push')
+        self.assertEquals(event['target'], 'nir0s/woo:1.0')
+        self.assertIn('time', event)
+
+    def _jocker(self, daemon):
+        outputfile = os.path.join(self.tmp_dir, 'context', 'Dockerfile')
+        os.makedirs(os.path.dirname(outputfile))
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, outputfile=outputfile,
+                   push='nir0s/woo:1.0')
+        j.client_config = daemon.client_config
+        return j
+
+    def test_build_and_push_events(self):
+        with FakeDaemon(build_steps=2, push_layers=2,
+                        progress_events=3) as daemon:
+            j = self._jocker(daemon)
+            j.generate()
+            j.build_image()
+            j.push_image()
+        types = [e['event'] for e in self._events()]
+        self.assertEquals(types[0], 'render')
+        self.assertEquals(types.count('build_step'), 2)
+        self.assertEquals(types.count('build_output'), 5)
+        self.assertEquals(types.count('push_progress'), 2 + 2 * 4 + 1)
+        self.assertEquals(types[-1], 'push')
+        image = [e for e in self._events() if e['event'] == 'image'][0]
+        self.assertEquals(image['id'], j.image_id)
+        self.assertEquals(image['build'], 'nir0s/woo:1.0')
+        self.assertFalse(image['cached'])
+        step = [e for e in self._events() if e['event'] == 'build_step'][1]
+        self.assertEquals(step['step'], 1)
+        self.assertEquals(step['instruction'], 'RUN echo 1')
+        push = self._events()[-1]
+        self.assertEquals(push['status'], 'pushed')
+        self.assertTrue(push['digest'].startswith('sha256:'))
+
+    def test_error_events(self):
+        with FakeDaemon(build_error='returned a non-zero code') as daemon:
+            j = self._jocker(daemon)
+            j.generate()
+            self.assertRaises(SystemExit, j.build_image)
+        error = self._events()[-1]
+        self.assertEquals(error['event'], 'error')
+        self.assertEquals(error['phase'], 'build')
+        self.assertEquals(error['message'], 'returned a non-zero code')
+
+    def test_cli_unknown_output(self):
+        ex = self.assertRaises(SystemExit, cli.jocker, {
+            '--varsfile': MOCK_VARS_FILE, '--templatefile': MOCK_DOCKER_FILE,
+            '--dryrun': True, '--output': 'xml'})
+        self.assertIn('xml', str(ex))
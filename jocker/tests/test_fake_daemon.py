@@ -0,0 +1,139 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.tests.fake_daemon import FakeDaemon
+from jocker.jocker import Jocker
+from jocker.jocker import _set_global_verbosity_level
+from jocker.timings import timings
+from jocker.tests import IsolatedTestCase
+
+import os
+import shutil
+import tempfile
+
+TEST_RESOURCES_DIR = 'jocker/tests/resources'
+MOCK_VARS_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_varsfile.py')
+MOCK_DOCKER_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_dockerfile')
+
+
+class TestFakeDaemon(IsolatedTestCase):
+    """builds and pushes end to end against the fake daemon"""
+
+    def setUp(self):
+        super(TestFakeDaemon, self).setUp()
+        _set_global_verbosity_level(is_verbose_output=False)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def _jocker(self, daemon, push='nir0s/woo:1.0'):
+        outputfile = os.path.join(self.tmp_dir, 'context', 'Dockerfile')
+        if not os.path.isdir(os.path.dirname(outputfile)):
+            os.makedirs(os.path.dirname(outputfile))
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, outputfile=outputfile,
+                   push=push)
+        j.client_config = daemon.client_config
+        j.generate()
+        return j
+
+    def _daemon(self, **kwargs):
+        daemon = FakeDaemon(**kwargs).start()
+        self.addCleanup(daemon.stop)
+        return daemon
+
+    def test_build_image(self):
+        daemon = self._daemon(build_steps=50)
+        j = self._jocker(daemon)
+        j.build_image()
+        self.assertEquals(len(daemon.contexts), 1)
+        self.assertTrue(daemon.contexts[0] > 0)
+        image = daemon.find_image('nir0s/woo:1.0')
+        self.assertEquals(j.image_id, image['Id'])
+        self.assertEquals(j.image_info['layers'], image['RootFS']['Layers'])
+
+    def test_build_image_from_named_dockerfile(self):
+        daemon = self._daemon()
+        outputfile = os.path.join(self.tmp_dir, 'context', 'Dockerfile.woo')
+        os.makedirs(os.path.dirname(outputfile))
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, outputfile=outputfile,
+                   build='nir0s/woo:1.0')
+        j.client_config = daemon.client_config
+        j.generate()
+        j.build_image()
+        with open(outputfile, 'rb') as f:
+            self.assertEquals(daemon.dockerfiles, [f.read()])
+        self.assertIsNotNone(daemon.find_image('nir0s/woo:1.0'))
+
+    def test_build_image_timings(self):
+        daemon = self._daemon(build_steps=5)
+        j = self._jocker(daemon)
+        timings.enable()
+        self.addCleanup(timings.disable)
+        j.build_image()
+        phases = dict((name, count) for name, count, _ in timings.summary())
+        self.assertEquals(phases['build'], 1)
+
+    def test_build_image_error(self):
+        daemon = self._daemon(build_error='Error: returned a non-zero code')
+        j = self._jocker(daemon)
+        ex = self.assertRaises(SystemExit, j.build_image)
+        self.assertEquals(str(ex), str(101))
+
+    def test_build_cache(self):
+        daemon = self._daemon()
+        j = self._jocker(daemon)
+        j.build_image()
+        j.build_image()
+        self.assertEquals(len(daemon.contexts), 1)
+
+    def test_tag_and_push(self):
+        daemon = self._daemon(events_per_chunk=7, progress_events=20)
+        j = self._jocker(daemon, push='nir0s/woo:1.0,nir0s/woo')
+        j.build_image()
+        j.tag_image()
+        report = j.push_image()
+        self.assertEquals(sorted(daemon.pushes),
+                          ['nir0s/woo:1.0', 'nir0s/woo:latest'])
+        self.assertEquals([r['status'] for r in report], ['pushed'] * 2)
+        self.assertTrue(all(r['digest'].startswith('sha256:')
+                            for r in report))
+        # pushing the same image again is pushed unless asked to skip it
+        report = j.push_image()
+        self.assertEquals(len(daemon.pushes), 4)
+        self.assertEquals([r['status'] for r in report], ['pushed'] * 2)
+        report = j.push_image(skip_pushed=True)
+        self.assertEquals(len(daemon.pushes), 4)
+        self.assertEquals([r['status'] for r in report], ['skipped'] * 2)
+
+    def test_push_error(self):
+        daemon = self._daemon(push_error='Error: Status 401')
+        j = self._jocker(daemon)
+        j.build_image()
+        ex = self.assertRaises(SystemExit, j.push_image)
+        self.assertEquals(str(ex), str(500))
+
+    def test_push_missing_image(self):
+        daemon = self._daemon()
+        j = self._jocker(daemon)
+        ex = self.assertRaises(SystemExit, j.push_image)
+        self.assertEquals(str(ex), str(500))
+
+    def test_slow_producer(self):
+        daemon = self._daemon(delay=0.01, build_steps=5, progress_events=2)
+        j = self._jocker(daemon)
+        j.build_image()
+        report = j.push_image()
+        self.assertEquals(report[0]['status'], 'pushed')
@@ -19,14 +19,35 @@ from jocker.jocker import _import_config
 from jocker.logger import init
 from jocker.jocker import _set_global_verbosity_level
 from jocker.jocker import Jocker
+from jocker.jocker import Renderer
 from jocker.jocker import execute
+from jocker.jocker import execute_matrix
 from jocker.jocker import JockerError
+from jocker.jocker import _get_environment
+from jocker.jocker import _BytecodeCache
+from jocker.jocker import _import_vars
+from jocker.jocker import _iter_json_objects
+from jocker.jocker import _iter_json_events
+from jocker.jocker import _encode_blocks
+from jocker.jocker import _parse_image_name
+from jocker.jocker import _ClientPool
+from jocker.jocker import DEFAULT_DOCKER_CONFIG
+from jocker.jocker import _RecordCache
+from jocker.jocker import jocker_lgr
+from jocker.scheduler import _parse_parents
+from jocker.tests import IsolatedTestCase
+import docker
 
-import testtools
 import os
 from testfixtures import log_capture
 import logging
 import json
+import glob
+import shutil
+import tempfile
+import subprocess
+import sys
+from io import BytesIO
 
 
 TEST_DIR = '{0}/test_dir'.format(os.path.expanduser("~"))
@@ -35,16 +56,76 @@ TEST_FILE = TEST_DIR + '/' + TEST_FILE_NAME
 TEST_RESOURCES_DIR = 'jocker/tests/resources'
 MOCK_CONFIG_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_docker_config.yaml')
 MOCK_VARS_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_varsfile.py')
+MOCK_YAML_VARS_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_varsfile.yaml')
+MOCK_JSON_VARS_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_varsfile.json')
 MOCK_DOCKER_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_dockerfile')
 BAD_CONFIG_FILE = os.path.join(TEST_RESOURCES_DIR, 'bad_config.py')
 BAD_YAML_FILE = os.path.join(TEST_RESOURCES_DIR, 'bad_yaml.yaml')
 TEST_OUTPUT_FILE = os.path.join(TEST_RESOURCES_DIR, 'test_outputfile')
+MOCK_MATRIX_VARS_FILES = os.path.join(TEST_RESOURCES_DIR, 'matrix', '*.py')
+TEST_MATRIX_OUTPUT_FILE = TEST_OUTPUT_FILE + '.{name}'
+TEST_PUSH_OUTPUT = [
+    '{"status":"The push refers to a repository [nir0s/woo] (len: 1)"}\r\n',
+    '{"status":"Sending image list"}{"status":"Pushing",',
+    '"progressDetail":{"current":1}}\r\n',
+]
+TEST_PUSH_ERROR = '{"errorDetail":{"message":"Error: Status 401"},' \
+    '"error":"Error: Status 401 trying to push repository nir0s/woo"}'
 TEST_JSON_STRING = \
     '{"status":"test one (len: 1)"}' \
     '{"status":"test two (len: 1)"}'
 
 
-class TestBase(testtools.TestCase):
+class MockResponse():
+
+    def __init__(self, status_code, reason):
+        self.status_code = status_code
+        self.reason = reason
+        self.content = ''
+
+
+class MockClient():
+
+    def __init__(self, push_output):
+        self.push_output = push_output
+        self.pushed = []
+        self.tagged = []
+
+    def push(self, repository, tag=None, stream=False):
+        self.pushed.append((repository, tag))
+        return iter(self.push_output)
+
+    def tag(self, image, repository, tag=None, force=False):
+        self.tagged.append((image, repository, tag))
+        return True
+
+    def build(self, path=None, tag=None, **kwargs):
+        self.built = getattr(self, 'built', 0) + 1
+        if getattr(self, 'build_error', None):
+            return iter([json.dumps({'error': self.build_error})])
+        if getattr(self, 'build_output', None):
+            return iter([json.dumps({'stream': self.build_output})])
+        # a rebuilt image exists again
+        self.removed = []
+        return iter(['{"stream":"Successfully built 0123456789ab\\n"}'])
+
+    def inspect_image(self, image_id):
+        if image_id in getattr(self, 'removed', []):
+            raise docker.errors.APIError(
+                'not found', MockResponse(404, 'Not Found'), 'no such image')
+        image_id = getattr(self, 'images', {}).get(image_id, image_id)
+        return {'Id': image_id, 'Size': 1234,
+                'RootFS': {'Layers': ['sha256:abcd']},
+                'RepoDigests': ['nir0s/woo@sha256:ef01']}
+
+
+class TestBase(IsolatedTestCase):
+
+    def _mock_jocker(self, push_output, push='nir0s/woo:latest'):
+        _set_global_verbosity_level(is_verbose_output=False)
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, push=push)
+        j.c = MockClient(push_output)
+        return j
 
     @log_capture()
     def test_set_global_verbosity_level(self, capture):
@@ -68,6 +149,10 @@ class TestBase(testtools.TestCase):
         self.assertIn('client', outcome.keys())
         self.assertIn('build', outcome.keys())
 
+    def test_import_config_file_cached(self):
+        self.assertIs(_import_config(MOCK_CONFIG_FILE),
+                      _import_config(MOCK_CONFIG_FILE))
+
     def test_fail_import_config_file(self):
         ex = self.assertRaises(RuntimeError, _import_config, '')
         self.assertEquals(str(ex), 'cannot access config file')
@@ -87,6 +172,135 @@ class TestBase(testtools.TestCase):
             self.assertIn('git make curl', f.read())
         os.remove(TEST_OUTPUT_FILE)
 
+    def test_generate_dockerfile_from_yaml_and_json_varsfiles(self):
+        for varsfile in (MOCK_YAML_VARS_FILE, MOCK_JSON_VARS_FILE):
+            output = execute(varsfile, MOCK_DOCKER_FILE, dryrun=True)
+            self.assertIn('FROM ubuntu:14.04', output)
+            self.assertIn('git make curl', output)
+
+    def test_import_vars_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        varsfile = os.path.join(tmp_dir, 'vars.json')
+        with open(varsfile, 'w') as f:
+            f.write('{"x": 1}')
+        variables = _import_vars(varsfile)
+        self.assertIs(variables, _import_vars(varsfile))
+        with open(varsfile, 'w') as f:
+            f.write('{"x": 22}')
+        self.assertEquals(_import_vars(varsfile), {'x': 22})
+
+    def test_renderer(self):
+        renderer = Renderer(MOCK_DOCKER_FILE)
+        variables = _import_vars(MOCK_VARS_FILE)
+        text = renderer.render(variables)
+        self.assertIn('git make curl', text)
+        self.assertEquals(''.join(renderer.stream(variables)), text)
+        fileobj = BytesIO()
+        renderer.dump(variables, fileobj)
+        self.assertEquals(fileobj.getvalue(), text.encode('utf-8'))
+        other = renderer.render(dict(variables, dependencies=['vim']))
+        self.assertIn('install -y vim', other)
+
+    def test_renderer_errors(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        ex = self.assertRaises(JockerError, Renderer,
+                               os.path.join(tmp_dir, 'missing'))
+        self.assertIn('template file missing', str(ex))
+        templatefile = os.path.join(tmp_dir, 'Dockerfile.template')
+        with open(templatefile, 'w') as f:
+            f.write('FROM {{ image.repository.name }}')
+        renderer = Renderer(templatefile, cache_dir=None)
+        ex = self.assertRaises(JockerError, renderer.render, {})
+        self.assertIn('could not generate template', str(ex))
+        self.assertRaises(JockerError, list, renderer.stream({}))
+        self.assertRaises(JockerError, renderer.render, ['not', 'a', 'dict'])
+        with open(templatefile, 'w') as f:
+            f.write('FROM {{ image|nosuchfilter }}')
+        ex = self.assertRaises(JockerError, Renderer, templatefile, None)
+        self.assertIn('could not load template', str(ex))
+
+    def test_jocker_render(self):
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE,
+                   outputfile=TEST_OUTPUT_FILE)
+        variables = _import_vars(MOCK_VARS_FILE)
+        self.assertIn('git make curl', j.render(variables))
+        template = j._renderer.template
+        j.render(dict(variables, dependencies=['vim']))
+        self.assertIs(j._renderer.template, template)
+        self.assertFalse(os.path.exists(TEST_OUTPUT_FILE))
+
+    def test_generate_streams_to_file(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        outputfile = os.path.join(tmp_dir, 'Dockerfile')
+        variables = _import_vars(MOCK_VARS_FILE)
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, outputfile=outputfile)
+        self.assertIsNone(j.generate())
+        with open(outputfile, 'rb') as f:
+            self.assertEquals(f.read(), j.render(variables).encode('utf-8'))
+        fileobj = BytesIO()
+        j.generate(fileobj)
+        self.assertEquals(fileobj.getvalue(),
+                          j.render(variables).encode('utf-8'))
+        self.assertEquals(list(_encode_blocks(['a', 'b', 'c'], 'utf-8', 2)),
+                          [b'ab', b'c'])
+
+    def test_generate_failure_keeps_outputfile(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        templatefile = os.path.join(tmp_dir, 'Dockerfile.template')
+        with open(templatefile, 'w') as f:
+            f.write('FROM {{ image }}\n{{ missing.attribute }}')
+        outputfile = os.path.join(tmp_dir, 'Dockerfile')
+        with open(outputfile, 'w') as f:
+            f.write('FROM ubuntu')
+        j = Jocker(None, templatefile, outputfile=outputfile,
+                   variables={'image': 'debian'})
+        ex = self.assertRaises(JockerError, j.generate)
+        self.assertIn('could not generate template', str(ex))
+        with open(outputfile) as f:
+            self.assertEquals(f.read(), 'FROM ubuntu')
+        self.assertEquals(sorted(os.listdir(tmp_dir)),
+                          ['Dockerfile', 'Dockerfile.template'])
+
+    def test_import_bad_vars(self):
+        ex = self.assertRaises(JockerError, _import_vars, BAD_YAML_FILE)
+        self.assertIn('bad vars file', str(ex))
+        ex = self.assertRaises(JockerError, _import_vars, 'missing.yaml')
+        self.assertIn('missing vars file', str(ex))
+
+    def test_generate_dockerfile_skip_unchanged(self):
+        result = execute(MOCK_VARS_FILE, MOCK_DOCKER_FILE, TEST_OUTPUT_FILE)
+        self.addCleanup(os.remove, TEST_OUTPUT_FILE)
+        self.assertTrue(result['changed'])
+        os.utime(TEST_OUTPUT_FILE, (0, 0))
+        result = execute(MOCK_VARS_FILE, MOCK_DOCKER_FILE, TEST_OUTPUT_FILE,
+                         skip_unchanged=True)
+        self.assertFalse(result['changed'])
+        self.assertEquals(os.path.getmtime(TEST_OUTPUT_FILE), 0)
+        with open(TEST_OUTPUT_FILE, 'a') as f:
+            f.write('\nEXPOSE 80')
+        result = execute(MOCK_VARS_FILE, MOCK_DOCKER_FILE, TEST_OUTPUT_FILE,
+                         skip_unchanged=True)
+        self.assertTrue(result['changed'])
+        with open(TEST_OUTPUT_FILE, 'r') as f:
+            self.assertNotIn('EXPOSE', f.read())
+
+    def test_skip_unchanged_still_builds(self):
+        builds = []
+        self.patch(Jocker, 'build_image', lambda j: builds.append(j.build))
+        for _ in range(2):
+            result = execute(MOCK_VARS_FILE, MOCK_DOCKER_FILE,
+                             TEST_OUTPUT_FILE, build='nir0s/woo:1.0',
+                             skip_unchanged=True)
+        self.addCleanup(os.remove, TEST_OUTPUT_FILE)
+        # the caller is told nothing changed, the build is still attempted
+        # (its inputs may have changed, or it may have failed before).
+        self.assertFalse(result['changed'])
+        self.assertEquals(builds, ['nir0s/woo:1.0'] * 2)
+
     def test_dryrun(self):
         output = execute(MOCK_VARS_FILE, MOCK_DOCKER_FILE,
                          TEST_OUTPUT_FILE, dryrun=True)
@@ -114,6 +328,95 @@ class TestBase(testtools.TestCase):
         for json_obj in output:
             json.loads(json_obj)
 
+    def test_json_stream_parser(self):
+        events = [
+            {'stream': 'Step 0 : FROM ubuntu:14.04\n'},
+            {'stream': 'braces { inside } "strings" \\ {{'},
+            {'status': 'nested', 'progressDetail': {'current': 1}},
+            {'stream': 'Successfully built 8dbd9e392a96\n'},
+        ]
+        data = '\r\n'.join(json.dumps(e) for e in events)
+        # split the stream at every possible offset, at every other
+        # character and not at all.
+        splits = [[data[:i], data[i:]] for i in range(len(data))]
+        splits.append([data[i:i + 2] for i in range(0, len(data), 2)])
+        splits.append([data])
+        for chunks in splits:
+            self.assertEquals(list(_iter_json_events(chunks)), events)
+
+    def test_json_stream_parser_markers(self):
+        events = [
+            {'stream': 'Step 0 : FROM ubuntu:14.04\n'},
+            {'error': 'failed'},
+            {'stream': 'Successfully built 8dbd9e392a96\n'},
+        ]
+        chunks = [json.dumps(e) for e in events] + ['{"stream": "broken}']
+        markers = ('"error"', 'Successfully built')
+        # irrelevant events are neither decoded nor logged unless verbose.
+        _set_global_verbosity_level(is_verbose_output=False)
+        self.assertEquals(
+            list(_iter_json_events(chunks, markers)), events[1:])
+        _set_global_verbosity_level(is_verbose_output=True)
+        self.addCleanup(_set_global_verbosity_level, False)
+        self.assertEquals(list(_iter_json_events(chunks, markers)), events)
+
+    def test_json_stream_parser_single_line(self):
+        output = list(_iter_json_objects([TEST_JSON_STRING]))
+        self.assertEquals(len(output), 2)
+        self.assertEquals(json.loads(output[1]),
+                          {'status': 'test two (len: 1)'})
+
+    def test_push_events(self):
+        j = self._mock_jocker(TEST_PUSH_OUTPUT)
+        events = list(j.iter_push_events())
+        self.assertEquals(len(events), 3)
+        self.assertEquals(events[2]['progressDetail'], {'current': 1})
+        j.push_image()
+
+    def test_tag_and_push_multiple_targets(self):
+        j = self._mock_jocker(
+            TEST_PUSH_OUTPUT, 'nir0s/woo:1.0, nir0s/woo:latest,'
+            'localhost:5000/woo:1.0')
+        self.assertEquals((j.repository, j.tag), ('nir0s/woo', '1.0'))
+        j.image_id = '8dbd9e392a96'
+        j.tag_image()
+        self.assertEquals(j.c.tagged, [
+            ('8dbd9e392a96', 'nir0s/woo', 'latest'),
+            ('8dbd9e392a96', 'localhost:5000/woo', '1.0')])
+        report = j.push_image(j.push_targets)
+        self.assertEquals(len(report), 3)
+        self.assertEquals(sorted(j.c.pushed), [
+            ('localhost:5000/woo', '1.0'), ('nir0s/woo', '1.0'),
+            ('nir0s/woo', 'latest')])
+
+    def test_push_error(self):
+        j = self._mock_jocker(TEST_PUSH_OUTPUT + [TEST_PUSH_ERROR])
+        ex = self.assertRaises(SystemExit, j.push_image)
+        self.assertEquals(str(ex), str(500))
+
+    def test_parse_image_name(self):
+        self.assertEquals(_parse_image_name('nir0s/woo:1.0'),
+                          ('nir0s/woo', '1.0'))
+        self.assertEquals(_parse_image_name('nir0s/woo'), ('nir0s/woo', None))
+        self.assertEquals(_parse_image_name('localhost:5000/woo'),
+                          ('localhost:5000/woo', None))
+        self.assertEquals(_parse_image_name('nir0s/woo@sha256:abcd'),
+                          ('nir0s/woo@sha256:abcd', None))
+        self.assertEquals(
+            _parse_image_name('localhost:5000/woo@sha256:abcd'),
+            ('localhost:5000/woo@sha256:abcd', None))
+
+    def test_client_pool(self):
+        pool = _ClientPool()
+        config = DEFAULT_DOCKER_CONFIG['client']
+        with pool.client(config) as c:
+            with pool.client(dict(config)) as other:
+                self.assertIsNot(c, other)
+        with pool.client(config) as reused:
+            self.assertIn(reused, (c, other))
+        with pool.client(dict(config, timeout=5)) as c:
+            self.assertEquals(c._timeout, 5)
+
     def test_build_or_dryrun(self):
         ex = self.assertRaises(SystemExit, execute, MOCK_VARS_FILE,
                                MOCK_DOCKER_FILE, build=True, dryrun=True)
@@ -123,3 +426,153 @@ class TestBase(testtools.TestCase):
         ex = self.assertRaises(SystemExit, execute, MOCK_VARS_FILE,
                                MOCK_DOCKER_FILE, push=True, dryrun=True)
         self.assertEquals(str(ex), str(100))
+
+    def test_generate_matrix(self):
+        report = execute_matrix(MOCK_MATRIX_VARS_FILES, MOCK_DOCKER_FILE,
+                                TEST_MATRIX_OUTPUT_FILE, workers=2)
+        self.assertEquals(len(report), 2)
+        for name, tag in (('trusty', '14.04'), ('precise', '12.04')):
+            outputfile = TEST_MATRIX_OUTPUT_FILE.format(name=name)
+            with open(outputfile, 'r') as f:
+                self.assertIn('FROM ubuntu:{0}'.format(tag), f.read())
+            os.remove(outputfile)
+
+    def test_generate_matrix_missing_varsfile(self):
+        ex = self.assertRaises(
+            SystemExit, execute_matrix, [MOCK_VARS_FILE, 'missing.py'],
+            MOCK_DOCKER_FILE, TEST_MATRIX_OUTPUT_FILE, workers=1)
+        self.assertEquals(str(ex), str(102))
+        os.remove(TEST_MATRIX_OUTPUT_FILE.format(name='mock_varsfile'))
+
+    def test_generate_matrix_without_name_in_outputfile(self):
+        ex = self.assertRaises(
+            SystemExit, execute_matrix, MOCK_MATRIX_VARS_FILES,
+            MOCK_DOCKER_FILE, TEST_OUTPUT_FILE)
+        self.assertEquals(str(ex), str(102))
+
+    def test_template_bytecode_cache(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        template_dir, template_file = os.path.split(MOCK_DOCKER_FILE)
+        env = _get_environment(template_dir, cache_dir)
+        env.get_template(template_file)
+        self.assertEquals(len(os.listdir(cache_dir)), 1)
+        cache = _BytecodeCache(cache_dir)
+        bucket = cache.get_bucket(
+            env, template_file, os.path.abspath(MOCK_DOCKER_FILE),
+            open(MOCK_DOCKER_FILE).read())
+        self.assertIsNotNone(bucket.code)
+
+    def test_template_bytecode_cache_eviction(self):
+        cache_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, cache_dir)
+        template_dir, template_file = os.path.split(MOCK_DOCKER_FILE)
+        env = _get_environment(template_dir, cache_dir)
+        env.bytecode_cache.max_size = 0
+        env.get_template(template_file)
+        self.assertEquals(glob.glob(os.path.join(cache_dir, '*')), [])
+
+    def test_build_cache(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        outputfile = os.path.join(tmp_dir, 'context', 'Dockerfile')
+        os.makedirs(os.path.dirname(outputfile))
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, outputfile=outputfile,
+                   build='nir0s/woo:latest')
+        j.c = MockClient([])
+        j.generate()
+        j.build_image()
+        j.build_image()
+        self.assertEquals(j.c.built, 1)
+        self.assertEquals(j.image_id, '0123456789ab')
+        self.assertEquals(j.image_info, {
+            'id': '0123456789ab', 'size': 1234, 'layers': ['sha256:abcd'],
+            'digests': ['nir0s/woo@sha256:ef01']})
+        self.assertEquals(
+            j.c.tagged, [('0123456789ab', 'nir0s/woo', 'latest')])
+        # an image which no longer exists is rebuilt
+        j.c.removed = ['0123456789ab']
+        j.build_image()
+        self.assertEquals(j.c.built, 2)
+        # as is an image built from different inputs
+        j.c.removed = []
+        with open(os.path.join(tmp_dir, 'context', 'file'), 'w') as f:
+            f.write('changed')
+        j.build_image()
+        self.assertEquals(j.c.built, 3)
+        # or from a parent image which changed under the same tag
+        parent = _parse_parents(outputfile)[0]
+        j.c.images = {parent: 'fedcba987654'}
+        j.build_image()
+        self.assertEquals(j.c.built, 4)
+        j.build_image()
+        self.assertEquals(j.c.built, 4)
+
+    def test_build_cache_max_entries(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        cache = _RecordCache(os.path.join(tmp_dir, 'records.json'), 2)
+        for i in range(3):
+            cache.set('key{0}'.format(i), 'image{0}'.format(i))
+        self.assertIsNone(cache.get('key0'))
+        self.assertEquals(cache.get('key2'), 'image2')
+
+    def test_record_cache_save_failure(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        blocker = os.path.join(tmp_dir, 'file')
+        open(blocker, 'w').close()
+        path = os.path.join(blocker, 'pushes.json')
+        messages = []
+        self.patch(jocker_lgr, 'debug',
+                   lambda msg, *args: messages.append(msg.format(*args)))
+        _RecordCache(path).set('key', 'record')
+        self.assertEquals(len(messages), 1)
+        self.assertTrue(messages[0].startswith(
+            'failed to save {0} ('.format(path)))
+
+    def test_build_error(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        outputfile = os.path.join(tmp_dir, 'Dockerfile')
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, outputfile=outputfile,
+                   build='nir0s/woo:latest')
+        j.c = MockClient([])
+        j.c.build_error = 'Error: no such file'
+        j.generate()
+        ex = self.assertRaises(SystemExit, j.build_image)
+        self.assertEquals(str(ex), str(101))
+        self.assertIsNone(j.image_info)
+        # an image which can't be inspected wasn't built either
+        j.c.build_error = None
+        j.c.build_output = 'Step 0 : FROM ubuntu'
+        j.c.removed = ['nir0s/woo:latest']
+        ex = self.assertRaises(SystemExit, j.build_image)
+        self.assertEquals(str(ex), str(101))
+
+    def test_build_raises_closes_context(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        outputfile = os.path.join(tmp_dir, 'Dockerfile')
+        j = Jocker(MOCK_VARS_FILE, MOCK_DOCKER_FILE, outputfile=outputfile,
+                   build='nir0s/woo:latest')
+        j.c = MockClient([])
+        contexts = []
+
+        def build(path=None, tag=None, **kwargs):
+            contexts.append(kwargs['fileobj'])
+            raise IOError('connection refused')
+        j.c.build = build
+        j.generate()
+        ex = self.assertRaises(SystemExit, j.build_image)
+        self.assertEquals(str(ex), str(101))
+        self.assertTrue(contexts[0].closed)
+
+    def test_lazy_imports(self):
+        # generating a Dockerfile mustn't pay for importing these.
+        modules = subprocess.Popen([sys.executable, '-c', (
+            'import sys, jocker.cli; print(" ".join(m for m in ('
+            '"docker", "yaml", "pkg_resources", "multiprocessing") '
+            'if m in sys.modules))')],
+            stdout=subprocess.PIPE).communicate()[0]
+        self.assertEquals(modules.strip(), '')
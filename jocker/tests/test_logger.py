@@ -0,0 +1,165 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker import logger
+
+import testtools
+import logging
+import os
+import shutil
+import tempfile
+import threading
+import signal
+import time
+
+
+class CountingHandler(logging.Handler):
+
+    def __init__(self):
+        logging.Handler.__init__(self)
+        self.messages = []
+        self.flushes = 0
+
+    def emit(self, record):
+        self.messages.append(self.format(record))
+        self.flush()
+
+    def flush(self):
+        self.flushes += 1
+
+
+class CountingFormat():
+
+    def __init__(self):
+        self.formatted = 0
+
+    def __format__(self, spec):
+        self.formatted += 1
+        return 'value'
+
+
+class TestLogger(testtools.TestCase):
+
+    def setUp(self):
+        super(TestLogger, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.addCleanup(logger.init, queued=True)
+
+    def test_queued_file_logging(self):
+        log_file = os.path.join(self.tmp_dir, 'jocker.log')
+        config = {
+            'version': 1,
+            'handlers': {
+                'file': {
+                    'class': 'logging.FileHandler',
+                    'filename': log_file,
+                },
+            },
+            'loggers': {
+                'user': {'handlers': ['file']},
+            },
+        }
+        lgr = logger.init(logging_config=config, queued=True)
+        for i in range(1000):
+            lgr.info('line %s', i)
+        logger.flush()
+        with open(log_file) as f:
+            lines = f.read().splitlines()
+        self.assertEquals(len(lines), 1000)
+        self.assertEquals(lines[-1], 'line 999')
+
+    def test_batched_flushes(self):
+        lgr = logger.init(logging_config={
+            'version': 1, 'loggers': {'user': {}}})
+        handler = CountingHandler()
+        lgr.addHandler(handler)
+        listener = logger.QueueListener([handler], batch_size=100)
+        lgr.removeHandler(handler)
+        queue_handler = logger.QueueHandler(listener)
+        lgr.addHandler(queue_handler)
+        self.addCleanup(lgr.removeHandler, queue_handler)
+        args = ['mutable']
+        # records are only handled once the listener starts, in batches.
+        for i in range(250):
+            lgr.info('%s %s', args, i)
+        args.append('changed')
+        listener.start()
+        listener.stop()
+        self.assertEquals(len(handler.messages), 250)
+        self.assertEquals(handler.messages[0], "['mutable'] 0")
+        self.assertEquals(handler.flushes, 3)
+
+    def test_brace_logger_formats_lazily(self):
+        lgr = logger.init(logging_config={
+            'version': 1, 'loggers': {'user': {'level': 'INFO'}}})
+        handler = CountingHandler()
+        lgr.addHandler(handler)
+        self.addCleanup(lgr.removeHandler, handler)
+        brace_lgr = logger.BraceLogger(lgr)
+        value = CountingFormat()
+        brace_lgr.debug('debug {0}', value)
+        self.assertEquals(value.formatted, 0)
+        self.assertEquals(handler.messages, [])
+        brace_lgr.info('info {0} {name} {{0}}', value, name='named')
+        brace_lgr.info('no args {0}')
+        self.assertEquals(value.formatted, 1)
+        self.assertEquals(
+            handler.messages, ['info value named {0}', 'no args {0}'])
+        self.assertEquals(brace_lgr.level, logging.INFO)
+
+    def test_handle_in_place_after_fork(self):
+        log_file = os.path.join(self.tmp_dir, 'jocker.log')
+        lgr = logger.init(logging_config={
+            'version': 1,
+            'handlers': {'file': {'class': 'logging.FileHandler',
+                                  'filename': log_file}},
+            'loggers': {'user': {'handlers': ['file']}},
+        }, queued=True)
+        handler = logger._listener.handlers[0]
+        # a fork while the listener thread is handling a batch leaves the
+        # handler's lock held by a thread which the child doesn't have.
+        locked, release = threading.Event(), threading.Event()
+
+        def hold():
+            with handler.lock:
+                locked.set()
+                release.wait()
+        thread = threading.Thread(target=hold)
+        thread.start()
+        locked.wait()
+        try:
+            pid = os.fork()
+            if pid == 0:
+                try:
+                    lgr.info('from child')
+                finally:
+                    os._exit(0)
+            for _ in range(100):
+                if os.waitpid(pid, os.WNOHANG)[0]:
+                    break
+                time.sleep(0.05)
+            else:
+                os.kill(pid, signal.SIGKILL)
+                os.waitpid(pid, 0)
+                self.fail('logging in a forked process deadlocked')
+        finally:
+            release.set()
+            thread.join()
+        logger.flush()
+        with open(log_file) as f:
+            self.assertEquals(f.read().splitlines(), ['from child'])
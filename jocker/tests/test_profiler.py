@@ -0,0 +1,96 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.profiler import profile
+from jocker.profiler import Sampler
+from jocker import cli
+
+import testtools
+import os
+import time
+import pstats
+import shutil
+import tempfile
+import threading
+
+TEST_RESOURCES_DIR = 'jocker/tests/resources'
+MOCK_VARS_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_varsfile.py')
+MOCK_DOCKER_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_dockerfile')
+
+
+def _busy(seconds):
+    end = time.time() + seconds
+    while time.time() < end:
+        pass
+    return 'done'
+
+
+class TestProfiler(testtools.TestCase):
+
+    def setUp(self):
+        super(TestProfiler, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def test_profile_pstats(self):
+        path = os.path.join(self.tmp_dir, 'jocker.pstats')
+        self.assertEquals(profile(_busy, path, 0.01), 'done')
+        stats = pstats.Stats(path)
+        self.assertIn('_busy', [f[2] for f in stats.stats])
+
+    def test_profile_collapsed(self):
+        if not Sampler.is_available():
+            self.skipTest('sampling is not available')
+        path = os.path.join(self.tmp_dir, 'jocker.collapsed')
+        self.assertEquals(profile(_busy, path, 0.2), 'done')
+        with open(path) as f:
+            lines = f.read().splitlines()
+        self.assertTrue(lines)
+        self.assertTrue(any('_busy (test_profiler.py' in line
+                            for line in lines))
+        stack, count = lines[0].rsplit(' ', 1)
+        self.assertTrue(int(count) > 0)
+
+    def test_sampler_samples_threads(self):
+        sampler = Sampler()
+        threads = [threading.Thread(target=_busy, args=(0.3,))
+                   for _ in range(2)]
+        sampler.start()
+        try:
+            for thread in threads:
+                thread.start()
+            # the main thread merely waits, as it does for builds and pushes.
+            for thread in threads:
+                thread.join()
+        finally:
+            sampler.stop()
+        busy = sum(count for stack, count in sampler.stacks.items()
+                   if '_busy (test_profiler.py' in stack)
+        # 2 threads * 0.3s / 5ms
+        self.assertTrue(busy > 20, busy)
+        self.assertFalse(any('_run (profiler.py' in stack
+                             for stack in sampler.stacks))
+
+    def test_cli_profile_out_with_exit(self):
+        path = os.path.join(self.tmp_dir, 'jocker.pstats')
+        ex = self.assertRaises(SystemExit, cli.jocker, {
+            '--varsfile': MOCK_VARS_FILE,
+            '--templatefile': 'missing_template',
+            '--profile-out': path,
+        })
+        self.assertEquals(str(ex), str(508))
+        self.assertTrue(os.path.isfile(path))
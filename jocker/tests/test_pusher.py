@@ -0,0 +1,143 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.pusher import Pusher
+from jocker.pusher import _get_registry
+from jocker.tests import IsolatedTestCase
+
+import contextlib
+import json
+import threading
+import time
+
+PUSH_OUTPUT = [
+    {'status': 'The push refers to a repository [{0}] (len: 1)'},
+    {'status': 'Image already pushed, skipping', 'id': '511136ea3c5a'},
+    {'status': '{1}: digest: sha256:0123abcd size: 1234'},
+]
+
+
+class MockClient():
+
+    def __init__(self, delay=0.1):
+        self.delay = delay
+        self.lock = threading.Lock()
+        self.active = {}
+        self.max_active = {}
+
+    def _stream(self, repository, tag):
+        registry = _get_registry(repository)
+        with self.lock:
+            self.active[registry] = self.active.get(registry, 0) + 1
+            self.max_active[registry] = max(
+                self.max_active.get(registry, 0), self.active[registry])
+        try:
+            time.sleep(self.delay)
+            if 'forbidden' in repository:
+                yield json.dumps({'error': 'Error: Status 403'})
+                return
+            for event in PUSH_OUTPUT:
+                yield json.dumps(dict(
+                    (k, v.format(repository, tag)) for k, v in event.items()))
+        finally:
+            with self.lock:
+                self.active[registry] -= 1
+
+    def push(self, repository, tag=None, stream=False):
+        self.pushed = getattr(self, 'pushed', 0) + 1
+        return self._stream(repository, tag)
+
+
+class TestPusher(IsolatedTestCase):
+
+    def setUp(self):
+        super(TestPusher, self).setUp()
+        self.mock_client = MockClient()
+
+    @contextlib.contextmanager
+    def client(self):
+        yield self.mock_client
+
+    def test_get_registry(self):
+        self.assertEquals(_get_registry('ubuntu'), 'index.docker.io')
+        self.assertEquals(_get_registry('nir0s/woo'), 'index.docker.io')
+        self.assertEquals(_get_registry('localhost:5000/woo'),
+                          'localhost:5000')
+        self.assertEquals(_get_registry('quay.io/nir0s/woo'), 'quay.io')
+
+    def test_push_concurrently(self):
+        targets = ['nir0s/woo:{0}'.format(i) for i in range(4)] + \
+            ['quay.io/nir0s/woo:{0}'.format(i) for i in range(4)]
+        start = time.time()
+        report = Pusher(self.client, registry_concurrency=2).push(targets)
+        # 4 pushes per registry, 2 at a time, both registries at once.
+        self.assertLess(time.time() - start, 0.35)
+        self.assertEquals([r['target'] for r in report], targets)
+        self.assertEquals(set(r['status'] for r in report), set(['pushed']))
+        self.assertEquals(report[0]['digest'], 'sha256:0123abcd')
+        self.assertEquals(self.mock_client.max_active,
+                          {'index.docker.io': 2, 'quay.io': 2})
+
+    def test_push_failure(self):
+        report = Pusher(self.client).push(
+            ['nir0s/forbidden:1', 'nir0s/woo:1', 'nir0s/woo:1'])
+        self.assertEquals(len(report), 2)
+        self.assertEquals(report[0]['status'], 'failed')
+        self.assertEquals(report[0]['code'], 500)
+        self.assertIn('403', report[0]['error'])
+        self.assertEquals(report[1]['status'], 'pushed')
+
+    def test_push_digest_reference(self):
+        report = Pusher(self.client, image_id='0123').push(
+            ['nir0s/woo@sha256:abcd', 'nir0s/woo:1'])
+        self.assertEquals(report[0]['status'], 'failed')
+        self.assertIn('digest', report[0]['error'])
+        self.assertEquals(report[1]['status'], 'pushed')
+        # nothing was pushed to nir0s/woo@sha256 (as tag abcd)
+        self.assertEquals(self.mock_client.pushed, 1)
+
+    def test_skip_pushed_image(self):
+        targets = ['nir0s/woo', 'nir0s/forbidden:1']
+        Pusher(self.client, image_id='0123').push(targets)
+        report = Pusher(self.client, image_id='0123',
+                        skip_pushed=True).push(targets)
+        self.assertEquals(self.mock_client.pushed, 3)
+        self.assertEquals(report[0]['status'], 'skipped')
+        self.assertEquals(report[0]['digest'], 'sha256:0123abcd')
+        self.assertEquals(report[1]['status'], 'failed')
+        # a different image is pushed regardless
+        report = Pusher(self.client, image_id='4567',
+                        skip_pushed=True).push(targets[:1])
+        self.assertEquals(report[0]['status'], 'pushed')
+        # as is the same image through another daemon or by another user
+        self.mock_client.base_url = 'http://otherhost:2375'
+        report = Pusher(self.client, image_id='0123',
+                        skip_pushed=True).push(targets[:1])
+        self.assertEquals(report[0]['status'], 'pushed')
+        self.mock_client._auth_configs = {
+            'https://index.docker.io/v1/': {'username': 'nir0s'}}
+        report = Pusher(self.client, image_id='0123',
+                        skip_pushed=True).push(targets[:1])
+        self.assertEquals(report[0]['status'], 'pushed')
+
+    def test_push_pushed_image_by_default(self):
+        # the registry may have lost the image since, so without
+        # skip_pushed, the record alone doesn't skip a push.
+        Pusher(self.client, image_id='0123').push(['nir0s/woo'])
+        report = Pusher(self.client, image_id='0123').push(['nir0s/woo'])
+        self.assertEquals(self.mock_client.pushed, 2)
+        self.assertEquals(report[0]['status'], 'pushed')
@@ -0,0 +1,106 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.jocker import JockerError
+from jocker.jocker import _normalize_image
+from jocker.scheduler import Scheduler
+
+import testtools
+import os
+import shutil
+import tempfile
+import time
+
+
+class MockJocker():
+
+    def __init__(self, outputfile, build, built, fail=False):
+        self.outputfile = outputfile
+        self.build = build
+        self.push = False
+        self.built = built
+        self.fail = fail
+
+    def build_image(self):
+        time.sleep(0.05)
+        if self.fail:
+            raise SystemExit(101)
+        self.built.append(self.build)
+
+
+class TestScheduler(testtools.TestCase):
+
+    def setUp(self):
+        super(TestScheduler, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.built = []
+
+    def _jocker(self, build, base, fail=False):
+        outputfile = os.path.join(self.tmp_dir, build.replace('/', '_'))
+        with open(outputfile, 'w') as f:
+            f.write('# comment\nFROM {0}\nRUN true\n'.format(base))
+        return MockJocker(outputfile, build, self.built, fail)
+
+    def test_normalize_image(self):
+        self.assertEquals(_normalize_image('base'), 'base:latest')
+        self.assertEquals(_normalize_image('org/base:1'), 'org/base:1')
+        self.assertEquals(_normalize_image('localhost:5000/base'),
+                          'localhost:5000/base:latest')
+
+    def test_build_order(self):
+        scheduler = Scheduler([
+            self._jocker('org/app:1', 'org/runtime:1'),
+            self._jocker('org/runtime:1', 'org/base'),
+            self._jocker('org/base:latest', 'ubuntu:14.04'),
+            self._jocker('org/tool:1', 'org/base:latest'),
+            self._jocker('org/other:1', 'ubuntu:14.04'),
+        ], workers=3)
+        statuses = scheduler.run()
+        self.assertEquals(set(statuses.values()), set(['built']))
+        for parent, child in (('org/base:latest', 'org/runtime:1'),
+                              ('org/runtime:1', 'org/app:1'),
+                              ('org/base:latest', 'org/tool:1')):
+            self.assertLess(self.built.index(parent), self.built.index(child))
+        path, duration = scheduler.critical_path()
+        self.assertEquals(
+            path, ['org/base:latest', 'org/runtime:1', 'org/app:1'])
+        self.assertGreater(duration, 0.1)
+
+    def test_independent_builds_run_concurrently(self):
+        jockers = [self._jocker('org/{0}:1'.format(i), 'ubuntu:14.04')
+                   for i in range(4)]
+        start = time.time()
+        Scheduler(jockers, workers=4).run()
+        self.assertLess(time.time() - start, 0.15)
+
+    def test_failed_parent_skips_children(self):
+        statuses = Scheduler([
+            self._jocker('org/base:1', 'ubuntu:14.04', fail=True),
+            self._jocker('org/app:1', 'org/base:1'),
+            self._jocker('org/other:1', 'ubuntu:14.04'),
+        ]).run()
+        self.assertEquals(statuses, {
+            'org/base:1': 'failed',
+            'org/app:1': 'skipped',
+            'org/other:1': 'built'})
+
+    def test_circular_dependency(self):
+        ex = self.assertRaises(JockerError, Scheduler, [
+            self._jocker('org/a:1', 'org/b:1'),
+            self._jocker('org/b:1', 'org/a:1')])
+        self.assertIn('circular dependency', str(ex))
@@ -0,0 +1,215 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.server import create_server
+from jocker.tests.fake_daemon import FakeDaemon
+from jocker.jocker import _set_global_verbosity_level
+from jocker.jocker import JockerError
+from jocker.tests import IsolatedTestCase
+import jocker.jocker
+import jocker.pusher
+import jocker.server
+import jocker.context
+
+import os
+import json
+import socket
+import shutil
+import tempfile
+import threading
+try:
+    import http.client as httplib
+except ImportError:
+    import httplib
+
+TEST_RESOURCES_DIR = 'jocker/tests/resources'
+MOCK_VARS_FILE = os.path.abspath(
+    os.path.join(TEST_RESOURCES_DIR, 'mock_varsfile.py'))
+MOCK_DOCKER_FILE = os.path.abspath(
+    os.path.join(TEST_RESOURCES_DIR, 'mock_dockerfile'))
+MOCK_VARS = {
+    'image': {'repository': 'ubuntu', 'tag': '14.04'},
+    'maintainer': {'name': 'nir0s', 'email': 'nir36g@gmail.com'},
+    'dependencies': ['git', 'make'],
+}
+
+
+class UnixHTTPConnection(httplib.HTTPConnection):
+
+    def __init__(self, path):
+        httplib.HTTPConnection.__init__(self, 'localhost')
+        self.path = path
+
+    def connect(self):
+        self.sock = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        self.sock.connect(self.path)
+
+
+TOKEN = 's3cr3t'
+
+
+class TestServer(IsolatedTestCase):
+
+    def setUp(self):
+        super(TestServer, self).setUp()
+        _set_global_verbosity_level(is_verbose_output=False)
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+
+    def _serve(self, **kwargs):
+        if 'socket_path' not in kwargs:
+            kwargs.setdefault('port', 0)
+            kwargs.setdefault('token', TOKEN)
+        server = create_server(workers=2, **kwargs)
+        thread = threading.Thread(target=server.serve_forever,
+                                  args=(0.05,))
+        thread.daemon = True
+        thread.start()
+        self.addCleanup(server.server_close)
+        self.addCleanup(server.shutdown)
+        return server
+
+    def _request(self, server, path, params, connection=None, headers=None):
+        connection = connection or httplib.HTTPConnection(
+            *server.server_address)
+        if headers is None:
+            headers = {'Content-Type': 'application/json',
+                       'Authorization': 'Bearer {0}'.format(TOKEN)}
+        connection.request('POST', path, json.dumps(params), headers)
+        response = connection.getresponse()
+        body = json.loads(response.read().decode('utf-8'))
+        connection.close()
+        return response.status, body
+
+    def test_render_vars(self):
+        server = self._serve()
+        status, body = self._request(server, '/render', {
+            'templatefile': MOCK_DOCKER_FILE, 'vars': MOCK_VARS,
+            'dryrun': True})
+        self.assertEquals(status, 200)
+        self.assertIn('FROM ubuntu:14.04', body['content'])
+        self.assertIn('git make', body['content'])
+
+    def test_render_varsfile(self):
+        server = self._serve()
+        outputfile = os.path.join(self.tmp_dir, 'Dockerfile')
+        status, body = self._request(server, '/render', {
+            'templatefile': MOCK_DOCKER_FILE, 'varsfile': MOCK_VARS_FILE,
+            'outputfile': outputfile})
+        self.assertEquals(status, 200)
+        self.assertTrue(body['changed'])
+        with open(outputfile) as f:
+            self.assertIn('git make curl', f.read())
+
+    def test_concurrent_renders(self):
+        server = self._serve()
+        results = []
+
+        def render(i):
+            variables = dict(MOCK_VARS, dependencies=['dep{0}'.format(i)])
+            results.append(self._request(server, '/render', {
+                'templatefile': MOCK_DOCKER_FILE, 'vars': variables,
+                'dryrun': True}))
+        threads = [threading.Thread(target=render, args=(i,))
+                   for i in range(10)]
+        for thread in threads:
+            thread.start()
+        for thread in threads:
+            thread.join()
+        self.assertEquals(sorted(r[0] for r in results), [200] * 10)
+        self.assertEquals(
+            len(set(r[1]['content'] for r in results)), 10)
+
+    def test_bad_requests(self):
+        server = self._serve()
+        status, body = self._request(server, '/render', {
+            'varsfile': MOCK_VARS_FILE, 'dryrun': True})
+        self.assertEquals(status, 400)
+        self.assertEquals(body['error'], 'templatefile is required')
+        status, body = self._request(server, '/deploy', {})
+        self.assertEquals(status, 400)
+        status, body = self._request(server, '/render', [])
+        self.assertEquals(status, 400)
+        status, body = self._request(server, '/render', {
+            'templatefile': os.path.join(self.tmp_dir, 'missing'),
+            'vars': MOCK_VARS, 'dryrun': True})
+        self.assertEquals(status, 400)
+        self.assertIn('template file missing', body['error'])
+
+    def test_unauthorized(self):
+        server = self._serve()
+        params = {'templatefile': MOCK_DOCKER_FILE, 'vars': MOCK_VARS,
+                  'dryrun': True}
+        status, body = self._request(server, '/render', params, headers={
+            'Content-Type': 'application/json'})
+        self.assertEquals(status, 401)
+        status, body = self._request(server, '/render', params, headers={
+            'Content-Type': 'application/json',
+            'Authorization': 'Bearer wrong'})
+        self.assertEquals(status, 401)
+
+    def test_content_type_required(self):
+        server = self._serve()
+        params = {'templatefile': MOCK_DOCKER_FILE, 'vars': MOCK_VARS,
+                  'dryrun': True}
+        # what a browser may send cross origin without a preflight
+        status, body = self._request(server, '/render', params, headers={
+            'Content-Type': 'text/plain',
+            'Authorization': 'Bearer {0}'.format(TOKEN)})
+        self.assertEquals(status, 415)
+        status, body = self._request(server, '/render', params, headers={
+            'Content-Type': 'application/json; charset=utf-8',
+            'Authorization': 'Bearer {0}'.format(TOKEN)})
+        self.assertEquals(status, 200)
+
+    def test_port_requires_token(self):
+        self.assertRaises(JockerError, create_server, port=0)
+
+    def test_default_unix_socket(self):
+        socket_path = os.path.join(self.tmp_dir, 'run', 'jocker.sock')
+        self.patch(jocker.server, 'DEFAULT_SOCKET', socket_path)
+        server = self._serve(socket_path=None)
+        self.assertEquals(server.server_address, socket_path)
+        self.assertEquals(os.stat(socket_path).st_mode & 0o777, 0o600)
+        status, body = self._request(server, '/render', {
+            'templatefile': MOCK_DOCKER_FILE, 'vars': MOCK_VARS,
+            'dryrun': True}, UnixHTTPConnection(socket_path),
+            {'Content-Type': 'application/json'})
+        self.assertEquals(status, 200)
+
+    def test_build_and_push_over_unix_socket(self):
+        socket_path = os.path.join(self.tmp_dir, 'jocker.sock')
+        server = self._serve(socket_path=socket_path)
+        with FakeDaemon() as daemon:
+            configfile = os.path.join(self.tmp_dir, 'docker.yaml')
+            with open(configfile, 'w') as f:
+                json.dump({'client': daemon.client_config,
+                           'build': {'rm': True, 'stream': True}}, f)
+            context_dir = os.path.join(self.tmp_dir, 'context')
+            os.makedirs(context_dir)
+            status, body = self._request(
+                server, '/push', {
+                    'templatefile': MOCK_DOCKER_FILE,
+                    'varsfile': MOCK_VARS_FILE,
+                    'outputfile': os.path.join(context_dir, 'Dockerfile'),
+                    'dockerconfig': configfile,
+                    'push': 'nir0s/woo:1.0'},
+                UnixHTTPConnection(socket_path))
+        self.assertEquals(status, 200)
+        self.assertEquals(body['image']['id'],
+                          daemon.find_image('nir0s/woo:1.0')['Id'])
+        self.assertEquals(body['pushed'][0]['status'], 'pushed')
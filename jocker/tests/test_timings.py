@@ -0,0 +1,104 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.timings import Timings
+from jocker.timings import timings
+from jocker import cli
+
+import testtools
+import os
+import json
+import shutil
+import tempfile
+
+TEST_RESOURCES_DIR = 'jocker/tests/resources'
+MOCK_VARS_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_varsfile.py')
+MOCK_DOCKER_FILE = os.path.join(TEST_RESOURCES_DIR, 'mock_dockerfile')
+MOCK_MATRIX_VARS_FILES = os.path.join(TEST_RESOURCES_DIR, 'matrix', '*.py')
+
+
+class TestTimings(testtools.TestCase):
+
+    def test_disabled(self):
+        t = Timings()
+        with t.phase('render'):
+            pass
+        self.assertEquals(t.summary(), [])
+
+    def test_summary(self):
+        t = Timings()
+        t.enable()
+        with t.phase('render'):
+            pass
+        with t.phase('build'):
+            pass
+        with t.phase('render'):
+            pass
+        summary = t.summary()
+        self.assertEquals([s[:2] for s in summary],
+                          [['render', 2], ['build', 1]])
+        self.assertEquals(len(t.format_table()), 3)
+        t.enable()
+        self.assertEquals(t.summary(), [])
+
+    def test_pop_and_extend(self):
+        t = Timings()
+        t.enable()
+        with t.phase('config'):
+            pass
+        mark = t.mark()
+        with t.phase('render'):
+            pass
+        records = t.pop(mark)
+        self.assertEquals([r[0] for r in records], ['render'])
+        self.assertEquals([s[0] for s in t.summary()], ['config'])
+        t.extend(records)
+        self.assertEquals([s[0] for s in t.summary()], ['config', 'render'])
+
+    def test_matrix_worker_timings(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.addCleanup(timings.disable)
+        timings_out = os.path.join(tmp_dir, 'timings.json')
+        cli.jocker({
+            '--matrix': MOCK_MATRIX_VARS_FILES,
+            '--templatefile': MOCK_DOCKER_FILE,
+            '--outputfile': os.path.join(tmp_dir, 'Dockerfile.{name}'),
+            '--workers': '2',
+            '--timings-out': timings_out,
+        })
+        with open(timings_out) as f:
+            phases = dict((p['phase'], p['count'])
+                          for p in json.load(f)['phases'])
+        # the variants are rendered by pool workers
+        self.assertEquals(phases['render'], 2)
+
+    def test_cli_timings_out(self):
+        tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, tmp_dir)
+        self.addCleanup(timings.disable)
+        timings_out = os.path.join(tmp_dir, 'timings.json')
+        cli.jocker({
+            '--varsfile': MOCK_VARS_FILE,
+            '--templatefile': MOCK_DOCKER_FILE,
+            '--dryrun': True,
+            '--timings-out': timings_out,
+        })
+        with open(timings_out) as f:
+            phases = [p['phase'] for p in json.load(f)['phases']]
+        self.assertEquals(
+            phases, ['config', 'compile', 'vars', 'render', 'total'])
@@ -0,0 +1,88 @@
+########
+# Copyright (c) 2014 GigaSpaces Technologies Ltd. All rights reserved
+#
+# Licensed under the Apache License, Version 2.0 (the "License");
+# you may not use this file except in compliance with the License.
+# You may obtain a copy of the License at
+#
+#        http://www.apache.org/licenses/LICENSE-2.0
+#
+# Unless required by applicable law or agreed to in writing, software
+# distributed under the License is distributed on an "AS IS" BASIS,
+#    * WITHOUT WARRANTIES OR CONDITIONS OF ANY KIND, either express or implied.
+#    * See the License for the specific language governing permissions and
+#    * limitations under the License.
+
+__author__ = 'nir0s'
+
+from jocker.jocker import Jocker
+from jocker.watcher import Watcher
+from jocker.watcher import pyinotify
+
+import testtools
+import os
+import shutil
+import tempfile
+
+TEMPLATE = "{% include 'base' %}\nRUN echo {{ message }}\n"
+BASE_TEMPLATE = "FROM ubuntu:14.04\n"
+VARS = "VARS = {{'message': '{0}'}}\n"
+
+
+class TestWatcher(testtools.TestCase):
+
+    def setUp(self):
+        super(TestWatcher, self).setUp()
+        self.tmp_dir = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, self.tmp_dir)
+        self.templatefile = self._write('Dockerfile.template', TEMPLATE)
+        self.basefile = self._write('base', BASE_TEMPLATE)
+        self.varsfile = self._write('vars.py', VARS.format('hello'))
+        self.outputfile = os.path.join(self.tmp_dir, 'Dockerfile')
+
+    def _write(self, name, content):
+        path = os.path.join(self.tmp_dir, name)
+        with open(path, 'w') as f:
+            f.write(content)
+        return path
+
+    def _read_output(self):
+        with open(self.outputfile) as f:
+            return f.read()
+
+    def _watcher(self, use_inotify):
+        j = Jocker(self.varsfile, self.templatefile, self.outputfile)
+        return Watcher(j, use_inotify=use_inotify)
+
+    def test_watched_files(self):
+        watcher = self._watcher(use_inotify=False)
+        watcher.regenerate()
+        self.assertEquals(watcher.files, set(
+            [self.templatefile, self.basefile, self.varsfile]))
+        self.assertIn('RUN echo hello', self._read_output())
+
+    def _test_regenerate_on_change(self, use_inotify):
+        watcher = self._watcher(use_inotify)
+        watcher.regenerate()
+        self.assertFalse(watcher.wait(0.1))
+        self._write('base', 'FROM ubuntu:12.04\n')
+        # make sure the mtime changes on filesystems with a coarse one
+        os.utime(self.basefile, (0, 0))
+        self.assertTrue(watcher.wait(1))
+        watcher.regenerate()
+        self.assertIn('FROM ubuntu:12.04', self._read_output())
+        self.assertFalse(watcher.wait(0.1))
+
+    def test_regenerate_on_change_polling(self):
+        self._test_regenerate_on_change(use_inotify=False)
+
+    def test_regenerate_on_change_inotify(self):
+        if not pyinotify:
+            self.skip('pyinotify is not installed')
+        self._test_regenerate_on_change(use_inotify=True)
+
+    def test_regenerate_with_bad_varsfile(self):
+        watcher = self._watcher(use_inotify=False)
+        self._write('vars.py', 'VARS = {')
+        watcher.regenerate()
+        self.assertIn(self.varsfile, watcher.files)
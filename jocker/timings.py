@@ -0,0 +1,131 @@
+import json
+import time
+import threading
+
+
+class _NullTimer():
+    """the timer handed out while timing is disabled. does nothing."""
+
+    def __enter__(self):
+        return self
+
+    def __exit__(self, *args):
+        return False
+
+
+_NULL_TIMER = _NullTimer()
+
+
+class _Timer():
+
+    def __init__(self, timings, name):
+        self.timings = timings
+        self.name = name
+
+    def __enter__(self):
+        self.start = time.time()
+        return self
+
+    def __exit__(self, *args):
+        self.timings.record(self.name, time.time() - self.start)
+        return False
+
+
+class Timings():
+    """records the time spent in each phase of a jocker run
+
+    Phases are timed by wrapping them with `phase`:
+
+        with timings.phase('render'):
+            ...
+
+    While disabled (the default), `phase` returns a shared no-op context
+    manager, so instrumented code pays for little more than a method call.
+    Phases may be timed from several threads and may be entered more than
+    once (e.g. `build` for each image of a matrix). Their durations are
+    summed.
+    """
+
+    def __init__(self):
+        self.enabled = False
+        self.records = []
+        self._lock = threading.Lock()
+
+    def enable(self):
+        """enables timing and discards anything recorded previously"""
+        with self._lock:
+            self.enabled = True
+            self.records = []
+
+    def disable(self):
+        self.enabled = False
+
+    def phase(self, name):
+        """returns a context manager timing the phase `name`"""
+        if not self.enabled:
+            return _NULL_TIMER
+        return _Timer(self, name)
+
+    def record(self, name, duration):
+        with self._lock:
+            self.records.append((name, duration))
+
+    def mark(self):
+        """returns a mark of what was recorded so far (see `pop`)"""
+        with self._lock:
+            return len(self.records)
+
+    def pop(self, mark):
+        """removes and returns what was recorded since `mark`, e.g. for a
+        worker process to hand its records over to its parent (see
+        `extend`).
+        """
+        with self._lock:
+            records = self.records[mark:]
+            del self.records[mark:]
+            return records
+
+    def extend(self, records):
+        """adds records recorded elsewhere (see `pop`)"""
+        with self._lock:
+            self.records.extend(tuple(r) for r in records)
+
+    def summary(self):
+        """returns a list of [phase, count, total seconds] for each phase in
+        the order the phases were first entered.
+        """
+        phases = {}
+        order = []
+        with self._lock:
+            for name, duration in self.records:
+                if name not in phases:
+                    phases[name] = [name, 0, 0.0]
+                    order.append(name)
+                phases[name][1] += 1
+                phases[name][2] += duration
+        return [phases[name] for name in order]
+
+    def format_table(self):
+        """returns the summary as a list of table rows (strings)"""
+        summary = self.summary()
+        width = max([len('phase')] + [len(s[0]) for s in summary])
+        rows = ['{0:<{1}}  {2:>5}  {3:>10}'.format(
+            'phase', width, 'count', 'total (ms)')]
+        for name, count, total in summary:
+            rows.append('{0:<{1}}  {2:>5}  {3:>10.1f}'.format(
+                name, width, count, total * 1000))
+        return rows
+
+    def to_dict(self):
+        return {
+            'phases': [{'phase': name, 'count': count, 'seconds': total}
+                       for name, count, total in self.summary()],
+        }
+
+    def dump(self, path):
+        """writes the summary to `path` as json"""
+        with open(path, 'w') as f:
+            json.dump(self.to_dict(), f, indent=2, sort_keys=True)
+
+
+timings = Timings()
@@ -0,0 +1,170 @@
+from __future__ import absolute_import
+import os
+import time
+from jinja2 import meta
+from jinja2 import TemplateError
+from jocker.jocker import jocker_lgr
+from jocker.jocker import _get_environment
+from jocker.jocker import JockerError
+try:
+    import pyinotify
+except ImportError:
+    pyinotify = None
+
+DEFAULT_DEBOUNCE = 0.05
+DEFAULT_POLL_INTERVAL = 0.05
+
+INOTIFY_MASK = 0
+if pyinotify:
+    INOTIFY_MASK = pyinotify.IN_CLOSE_WRITE | pyinotify.IN_MOVED_TO | \
+        pyinotify.IN_CREATE | pyinotify.IN_DELETE
+
+
+class Watcher():
+    """regenerates a Dockerfile whenever its template, any template it
+    includes, imports or extends or its varsfile changes.
+
+    The same `Jocker` object (and so the same jinja2 environment) is used
+    throughout, so only templates which actually changed are recompiled.
+    Changes are detected using inotify if pyinotify is installed and by
+    polling the files' mtimes otherwise. Bursts of changes (e.g. an editor
+    saving several files) are debounced into a single regeneration.
+    """
+
+    def __init__(self, jocker, build=False, debounce=DEFAULT_DEBOUNCE,
+                 poll_interval=DEFAULT_POLL_INTERVAL, use_inotify=True):
+        """
+        :param jocker: the `Jocker` object to regenerate with.
+        :param bool build: whether to build an image after regenerating.
+        :param float debounce: seconds to wait for changes to settle.
+        :param float poll_interval: seconds between polls when polling.
+        :param bool use_inotify: use inotify if it's available.
+        """
+        self.jocker = jocker
+        self.build = build
+        self.debounce = debounce
+        self.poll_interval = poll_interval
+        self.files = set()
+        self._snapshot = {}
+        self._notifier = None
+        self._changes = set()
+        if use_inotify and pyinotify:
+            self._watch_manager = pyinotify.WatchManager()
+            self._notifier = pyinotify.Notifier(
+                self._watch_manager, self._record_event)
+            self._watched_dirs = {}
+
+    def _find_files(self):
+        """returns the paths of the varsfile and every template which the
+        template depends on.
+        """
+        env = _get_environment(self.jocker.template_dir)
+        files = set([os.path.abspath(self.jocker.varsfile)])
+        pending = [self.jocker.template_file]
+        seen = set()
+        while pending:
+            name = pending.pop()
+            seen.add(name)
+            try:
+                source, path, _ = env.loader.get_source(env, name)
+                files.add(os.path.abspath(path))
+                referenced = meta.find_referenced_templates(
+                    env.parse(source))
+            except TemplateError as ex:
+                jocker_lgr.debug('cannot resolve {0} ({1})', name, ex)
+                continue
+            # dynamically referenced templates (None) can't be resolved.
+            pending.extend(
+                [n for n in referenced if n and n not in seen])
+        return files
+
+    def _stat(self, path):
+        try:
+            stat = os.stat(path)
+            return stat.st_mtime, stat.st_size
+        except OSError:
+            return None
+
+    def _update(self):
+        self.files = self._find_files()
+        self._snapshot = dict((path, self._stat(path)) for path in self.files)
+        if self._notifier:
+            # directories are watched rather than files as editors tend to
+            # replace files rather than write to them.
+            for directory in set(os.path.dirname(f) for f in self.files):
+                if directory not in self._watched_dirs:
+                    self._watched_dirs.update(self._watch_manager.add_watch(
+                        directory, INOTIFY_MASK))
+        jocker_lgr.debug('watching: {0}', ', '.join(sorted(
+            self.files)))
+
+    def _record_event(self, event):
+        if event.pathname in self.files:
+            self._changes.add(event.pathname)
+
+    def _poll(self):
+        for path in self.files:
+            stat = self._stat(path)
+            if stat != self._snapshot.get(path):
+                self._snapshot[path] = stat
+                self._changes.add(path)
+        return bool(self._changes)
+
+    def wait(self, timeout=None):
+        """waits for any of the watched files to change
+
+        :param float timeout: seconds to wait. waits forever if None.
+        :rtype: `bool` stating whether anything changed.
+        """
+        deadline = None if timeout is None else time.time() + timeout
+        while not self._changes:
+            remaining = None if deadline is None else deadline - time.time()
+            if remaining is not None and remaining <= 0:
+                break
+            if self._notifier:
+                # pyinotify expects milliseconds
+                if self._notifier.check_events(
+                        None if remaining is None else remaining * 1000):
+                    self._notifier.read_events()
+                    self._notifier.process_events()
+            elif not self._poll():
+                time.sleep(self.poll_interval if remaining is None
+                           else min(self.poll_interval, remaining))
+        return bool(self._changes)
+
+    def regenerate(self):
+        """regenerates the Dockerfile and optionally builds an image from
+        it. Failures are logged rather than raised so that watching can
+        carry on once the problem is fixed.
+        """
+        self._changes.clear()
+        start = time.time()
+        try:
+            self.jocker.generate()
+            if self.build and self.jocker.changed:
+                self.jocker.build_image()
+        except (JockerError, SystemExit) as ex:
+            jocker_lgr.error('failed to regenerate ({0})', ex)
+        else:
+            jocker_lgr.info('regenerated in {0:.0f}ms',
+                            (time.time() - start) * 1000)
+        finally:
+            self._update()
+
+    def run(self):
+        """regenerates and keeps regenerating on change until interrupted
+        """
+        jocker_lgr.info('watching for changes ({0}), press Ctrl+C to '
+                        'stop...', 'inotify' if self._notifier else 'polling')
+        self.regenerate()
+        try:
+            while True:
+                self.wait()
+                while self.wait(self.debounce):
+                    self._changes.clear()
+                self.regenerate()
+        except KeyboardInterrupt:
+            jocker_lgr.info('stopped watching')
+        finally:
+            if self._notifier:
+                self._notifier.stop()